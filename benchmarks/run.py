@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+'''Simple benchmark suite for :mod:`glorpen.di`.
+
+Run with ``python benchmarks/run.py [benchmark name...]``.
+
+.. moduleauthor:: Arkadiusz Dzięgiel <arkadiusz.dziegiel@glorpen.pl>
+
+'''
+import os
+import sys
+import time
+import timeit
+import threading
+import subprocess
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+from glorpen.di import Container
+from glorpen.di.scopes import ScopePrototype, ScopeSingleton, ScopeThread
+from glorpen.di.tracing import Tracer
+
+benchmarks = []
+
+def benchmark(f):
+    benchmarks.append(f)
+    return f
+
+def measure(stmt, number=10000, repeat=5):
+    """Returns best time of single *stmt* call, in microseconds."""
+    return min(timeit.repeat(stmt, number=number, repeat=repeat)) / number * 1e6
+
+def measure_allocated_bytes(f, number=1000):
+    """Returns average peak of bytes allocated by single *f* call."""
+    f()
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(number):
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            f()
+            peaks.append(tracemalloc.get_traced_memory()[1] - start)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / float(number)
+
+def report(name, results, unit="us"):
+    print(name)
+    for label, value in results:
+        print("  %-40s %10.3f %s" % (label, value, unit))
+
+class Shared(object):
+    pass
+
+def _make_handler_classes(count):
+    classes = []
+    for i in range(count):
+        def __init__(self, shared, other):
+            self.shared = shared
+            self.other = other
+        classes.append(type("Handler%d" % i, (object,), {"__init__": __init__}))
+    return classes
+
+@benchmark
+def get_many():
+    """Resolving 15 prototype services sharing dependencies."""
+    handlers = _make_handler_classes(15)
+    
+    c = Container()
+    c.add_service(Shared)
+    c.add_service("other").implementation(Shared).scope(ScopePrototype)
+    for cls in handlers:
+        c.add_service(cls).kwargs(shared__svc=Shared, other__svc="other").scope(ScopePrototype)
+    
+    def loop():
+        return [c.get(cls) for cls in handlers]
+    
+    report("get_many: 15 services", [
+        ("loop of Container.get", measure(loop, number=2000)),
+        ("Container.get_many", measure(lambda: c.get_many(*handlers), number=2000)),
+        ("Container.get_many(share_prototypes)", measure(lambda: c.get_many(*handlers, share_prototypes=True), number=2000)),
+    ])
+
+class Configurator(object):
+    def configure(self, instance, value):
+        instance.configured = value
+
+class PostConstructed(object):
+    def a(self, value): pass
+    def b(self, value): pass
+    def c(self, value, other): pass
+    def d(self): pass
+    def e(self, shared): pass
+
+def _post_construction_container():
+    c = Container()
+    c.add_service(Shared)
+    c.add_service(Configurator)
+    c.add_service(PostConstructed).scope(ScopePrototype)\
+        .call("a", value=1)\
+        .call("b", value="b")\
+        .call("c", value=1, other=2)\
+        .call("d")\
+        .call("e", shared__svc=Shared)\
+        .configurator(service=Configurator, method="configure", value=1)\
+        .configurator(callable=lambda instance, value: None, value=2)\
+        .configurator(callable=lambda instance, shared: None, shared__svc=Shared)
+    return c
+
+@benchmark
+def post_construction():
+    """Creating prototype service with 5 calls and 3 configurators."""
+    c = _post_construction_container()
+    get = lambda: c.get(PostConstructed)
+    
+    report("post_construction: 5 calls, 3 configurators", [
+        ("Container.get", measure(get, number=5000)),
+    ])
+    report("post_construction: allocations per get", [
+        ("peak allocated memory", measure_allocated_bytes(get)),
+    ], unit="B")
+
+@benchmark
+def tracing():
+    """Overhead of tracing hook, disabled and with no-op tracer."""
+    c = Container()
+    c.add_service(Shared)
+    c.add_service(PostConstructed).scope(ScopePrototype).call("e", shared__svc=Shared)
+    
+    results = []
+    for label, tracer in (("disabled", None), ("no-op tracer", Tracer())):
+        c.tracer = tracer
+        results.append(("singleton get, %s" % label, measure(lambda: c.get(Shared))))
+        results.append(("prototype get, %s" % label, measure(lambda: c.get(PostConstructed))))
+    
+    report("tracing", results)
+
+@benchmark
+def thread_scope():
+    """Hit path of thread scope compared to singleton scope."""
+    c = Container()
+    c.set_scope_hierarchy(ScopeSingleton, ScopeThread, ScopePrototype)
+    c.add_service(Shared)
+    c.add_service("thread").implementation(Shared).scope(ScopeThread)
+    c.get("thread")
+    
+    singleton = c.scopes[0]
+    thread = c.scopes[1]
+    creator = lambda: None
+    
+    report("thread_scope", [
+        ("ScopeSingleton.get hit", measure(lambda: singleton.get(creator, "__main__.Shared"), number=100000)),
+        ("ScopeThread.get hit", measure(lambda: thread.get(creator, "thread"), number=100000)),
+        ("Container.get, singleton", measure(lambda: c.get(Shared))),
+        ("Container.get, thread", measure(lambda: c.get("thread"))),
+    ])
+
+@benchmark
+def singleton_get():
+    """Singleton cache hit compared to plain dict lookup."""
+    c = Container()
+    c.add_service(Shared)
+    c.add_alias(Shared, "shared")
+    c.get(Shared)
+    c.get("shared")
+    
+    d = {Shared: Shared()}
+    
+    report("singleton_get", [
+        ("dict lookup", measure(lambda: d[Shared], number=100000)),
+        ("Container.get(cls)", measure(lambda: c.get(Shared), number=100000)),
+        ("Container.get(alias)", measure(lambda: c.get("shared"), number=100000)),
+    ])
+
+@benchmark
+def create_many():
+    """Creating 1000 prototype instances with shared dependencies."""
+    handlers = _make_handler_classes(1)
+    
+    c = Container()
+    c.add_service(Shared)
+    c.add_service("other").implementation(Shared).scope(ScopePrototype)
+    c.add_service(handlers[0]).kwargs(shared__svc=Shared, other__svc="other").scope(ScopePrototype)
+    
+    report("create_many: 1000 instances", [
+        ("loop of Container.get", measure(lambda: [c.get(handlers[0]) for _ in range(1000)], number=20)),
+        ("Container.create_many", measure(lambda: list(c.create_many(handlers[0], 1000)), number=20)),
+        ("Container.create_many(share_prototypes)", measure(lambda: list(c.create_many(handlers[0], 1000, share_prototypes=True)), number=20)),
+    ])
+
+def _threads_throughput(f, threads, calls):
+    """Returns calls per second of *f* called *calls* times by each of *threads* threads."""
+    start = threading.Event()
+    def worker():
+        start.wait()
+        for _ in range(calls):
+            f()
+    
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    begin = time.perf_counter()
+    start.set()
+    for t in workers:
+        t.join()
+    return threads * calls / (time.perf_counter() - begin)
+
+@benchmark
+def threads_scaling():
+    """Container.get throughput with 1-32 threads, total calls per second (higher is better)."""
+    handlers = _make_handler_classes(1)
+    
+    c = Container()
+    c.add_service(Shared)
+    c.add_service("other").implementation(Shared).scope(ScopePrototype)
+    c.add_service(handlers[0]).kwargs(shared__svc=Shared, other__svc="other").scope(ScopePrototype)
+    c.get(Shared)
+    
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)
+    print("threads_scaling: GIL %s" % ("enabled" if is_gil_enabled() else "disabled"))
+    
+    results = []
+    for threads in (1, 2, 4, 8, 16, 32):
+        calls = 200000 // threads
+        results.append(("singleton, %d threads" % threads, _threads_throughput(lambda: c.get(Shared), threads, calls) / 1000.0))
+        results.append(("prototype, %d threads" % threads, _threads_throughput(lambda: c.get(handlers[0]), threads, calls // 10) / 1000.0))
+    report("threads_scaling", results, unit="k/s")
+
+#: allowed growth of single registration time between 1000 and 10000 registered services
+REGISTRATION_SCALING_BUDGET = 3
+
+@benchmark
+def registration_scaling():
+    """Time of registering single service in containers with 1000-10000 services, should not grow with count."""
+    results = []
+    for count in (1000, 3000, 10000):
+        handlers = _make_handler_classes(count)
+        begin = time.perf_counter()
+        c = Container()
+        for cls in handlers:
+            c.add_service(cls).kwargs(shared__svc=Shared, other__svc=Shared)
+        results.append(("%d services" % count, (time.perf_counter() - begin) / count * 1e6))
+    
+    report("registration_scaling: per service", results)
+    if results[-1][1] > results[0][1] * REGISTRATION_SCALING_BUDGET:
+        print("  registration time grows with count of services!")
+        return False
+
+#: budget for importing glorpen.di (without parent namespace package), in microseconds
+IMPORT_TIME_BUDGET = 5000
+
+@benchmark
+def import_time():
+    """Time of importing glorpen.di package, measured by python -X importtime."""
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    env["PYTHONPATH"] = sys.path[0]
+    
+    results = []
+    for _ in range(5):
+        out = subprocess.check_output([sys.executable, "-X", "importtime", "-c", "import glorpen.di"], env=env, stderr=subprocess.STDOUT)
+        times = {}
+        for line in out.decode().splitlines():
+            parts = [i.strip() for i in line.split("|")]
+            if len(parts) == 3 and parts[1].isdigit():
+                times[parts[2]] = int(parts[1])
+        # parent namespace package is imported as part of glorpen.di
+        results.append(times["glorpen.di"] - times["glorpen"])
+    
+    # first run could compile bytecode
+    best = min(results[1:])
+    report("import_time", [
+        ("import glorpen.di", best),
+        ("budget", IMPORT_TIME_BUDGET),
+    ])
+    if best > IMPORT_TIME_BUDGET:
+        print("  import time is over budget!")
+        return False
+
+def main(names):
+    ok = True
+    for f in benchmarks:
+        if not names or f.__name__ in names:
+            ok = f() is not False and ok
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if main(sys.argv[1:]) else 1)
@@ -8,7 +8,6 @@ Created on 12 gru 2015
 from setuptools import setup, find_packages
 import re
 import os
-import sys
 
 root_dir = os.path.realpath(os.path.dirname(__file__))
 with open("%s/src/glorpen/di/__init__.py" % root_dir, "rt") as f:
@@ -17,14 +16,12 @@ with open("%s/src/glorpen/di/__init__.py" % root_dir, "rt") as f:
 with open("%s/README.rst" % root_dir, "rt") as f:
     long_description = f.read()
 
-requires = ["funcsigs"] if sys.hexversion < 0x03030000 else []
-
 setup (
   name = 'glorpen-di',
   version = version,
   packages = ['glorpen.di'],
   package_dir = {'': 'src'},
-  install_requires = requires + ['six>=1.9'],
+  install_requires = ['funcsigs; python_version < "3.3"', 'six>=1.9; python_version < "3"'],
   dependency_links = [],
   namespace_packages  = ['glorpen'],
   author = 'Arkadiusz Dzięgiel',
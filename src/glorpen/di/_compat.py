@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+'''Python 2 and 3 compatibility helpers.
+
+On Python 3 only builtins are used, :mod:`six` is imported on Python 2 only.
+Modules not needed for importing the package (:mod:`threading`, :mod:`weakref`) are loaded on first use.
+
+.. moduleauthor:: Arkadiusz Dzięgiel <arkadiusz.dziegiel@glorpen.pl>
+
+'''
+import sys
+import types
+import importlib
+
+class _LazyModule(object):
+    """Imports given module on first attribute access."""
+    
+    def __init__(self, name):
+        super(_LazyModule, self).__init__()
+        self.__name = name
+    
+    def __getattr__(self, attr):
+        value = getattr(importlib.import_module(self.__name), attr)
+        # next lookups do not reach __getattr__
+        setattr(self, attr, value)
+        return value
+
+threading = _LazyModule("threading")
+weakref = _LazyModule("weakref")
+
+if sys.version_info[0] == 2:
+    import six
+    
+    class_types = (type, types.ClassType)
+    
+    def reraise(e):
+        """Raises given exception again, without internal traceback."""
+        six.reraise(e.__class__, e)
+    
+    def raise_from(e, cause):
+        six.raise_from(e, cause)
+else:
+    class_types = (type,)
+    
+    def reraise(e):
+        """Raises given exception again, without internal traceback."""
+        raise e.with_traceback(None)
+    
+    def raise_from(e, cause):
+        # same as "raise e from cause"
+        e.__cause__ = cause
+        raise e
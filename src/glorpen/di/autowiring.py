@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+'''Type hints inspection used for arguments autowiring.
+
+Hints are resolved by :func:`typing.get_type_hints` (so string annotations and postponed evaluation are supported)
+only once per function.
+
+.. moduleauthor:: Arkadiusz Dzięgiel <arkadiusz.dziegiel@glorpen.pl>
+
+'''
+import types
+import inspect
+import weakref
+import collections
+
+try:
+    import typing
+except ImportError:
+    typing = None
+
+try:
+    from inspect import signature
+    signature_empty = inspect.Parameter.empty
+except ImportError:
+    from funcsigs import signature
+    from funcsigs import _empty as signature_empty
+
+try:
+    from collections import abc as collections_abc
+except ImportError:
+    collections_abc = collections
+
+_union_types = tuple(i for i in (getattr(typing, "Union", None), getattr(types, "UnionType", None)) if i is not None)
+_collection_types = (list, tuple, set, frozenset) + tuple(
+    getattr(collections_abc, i) for i in ("Sequence", "Iterable", "Collection", "Set") if hasattr(collections_abc, i)
+)
+
+class Requirement(object):
+    """Argument requirement detected from type hint.
+
+    Args:
+        name: argument name
+        candidates: tuple of types (or names) that argument accepts
+        optional: if `None` is accepted
+        many: if argument is a collection of given types
+        has_default: if argument has default value
+    """
+
+    __slots__ = ("name", "candidates", "optional", "many", "has_default")
+
+    def __init__(self, name, candidates, optional=False, many=False, has_default=False):
+        super(Requirement, self).__init__()
+        self.name = name
+        self.candidates = candidates
+        self.optional = optional
+        self.many = many
+        self.has_default = has_default
+
+_cache = weakref.WeakKeyDictionary()
+
+def _get_origin(hint):
+    if _union_types and type(hint).__name__ == "UnionType":
+        return type(hint)
+    origin = getattr(hint, "__origin__", None)
+    # on Python 3.6 origin of List[X] is typing.List, runtime class is kept in __extra__
+    return getattr(origin, "__extra__", None) or origin
+
+def _evaluate(function, annotation):
+    if not isinstance(annotation, str):
+        return annotation
+    try:
+        return eval(annotation, getattr(function, "__globals__", {}))
+    except Exception:
+        return annotation
+
+def _get_hints(function):
+    try:
+        sig = signature(function)
+    except (ValueError, TypeError):
+        return None, {}
+
+    hints = None
+    if typing is not None:
+        try:
+            hints = typing.get_type_hints(function)
+        except Exception:
+            pass
+
+    if hints is None:
+        hints = dict((name, _evaluate(function, p.annotation)) for name, p in sig.parameters.items() if p.annotation is not signature_empty)
+
+    return sig, hints
+
+def _create_requirement(name, hint):
+    origin = _get_origin(hint)
+    if origin is None:
+        return Requirement(name, (hint,))
+
+    args = getattr(hint, "__args__", None) or ()
+
+    if origin in _union_types:
+        candidates = tuple(i for i in args if i is not type(None))
+        optional = len(candidates) != len(args)
+        if len(candidates) == 1:
+            req = _create_requirement(name, candidates[0])
+            req.optional = req.optional or optional
+            return req
+        return Requirement(name, candidates, optional=optional)
+
+    if origin in _collection_types:
+        if origin is tuple and not (len(args) == 2 and args[1] is Ellipsis):
+            return None
+        if len(args) >= 1:
+            return Requirement(name, (args[0],), many=True)
+
+    return None
+
+def _build_requirements(function):
+    sig, hints = _get_hints(function)
+    if sig is None:
+        return ()
+
+    ret = []
+    for name, param in sig.parameters.items():
+        if name == "self" or param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        if not name in hints:
+            continue
+        req = _create_requirement(name, hints[name])
+        if req:
+            req.has_default = param.default is not signature_empty
+            ret.append(req)
+    return tuple(ret)
+
+def get_requirements(function):
+    """Returns tuple of :class:`.Requirement` for given callable, result is cached."""
+    function = getattr(function, "__func__", function)
+    try:
+        return _cache[function]
+    except KeyError:
+        pass
+    except TypeError:
+        # not weak-referenceable, eg. builtin slot wrappers
+        return _build_requirements(function)
+
+    ret = _cache[function] = _build_requirements(function)
+    return ret
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+'''Ahead-of-time compilation of configured container to plain Python module.
+
+Generated module has a getter function for each service, with direct imports and inlined
+constructor calls, setters, method calls and singleton caching. It does not import :mod:`glorpen.di`.
+
+.. code-block:: python
+
+   from glorpen.di.compiler import compile_container
+
+   with open("myapp/compiled_container.py", "wt") as f:
+       f.write(compile_container(build_container()))
+
+   from myapp import compiled_container
+   compiled_container.get(MyService)
+
+Only services in :class:`glorpen.di.scopes.ScopeSingleton` and :class:`glorpen.di.scopes.ScopePrototype` scopes are supported.
+All used classes and callables should be importable by their module and qualified name
+and constant arguments should be literals. Parameters are resolved during compilation.
+Exceptions raised by services are not wrapped in :class:`glorpen.di.exceptions.InjectionException`.
+
+.. moduleauthor:: Arkadiusz Dzięgiel <arkadiusz.dziegiel@glorpen.pl>
+
+'''
+import re
+import keyword
+import importlib
+
+from glorpen.di import exceptions
+from glorpen.di.container import Container, Service, Alias, Deffered, normalize_name
+from glorpen.di.scopes import ScopeSingleton, ScopePrototype
+
+_identifier = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_literal_types = (type(None), bool, int, float, complex, str, bytes)
+
+def _is_identifier(name):
+    return bool(_identifier.match(name)) and not keyword.iskeyword(name)
+
+class _Imports(object):
+    """Keeps imports of generated module."""
+    def __init__(self):
+        super(_Imports, self).__init__()
+        self._aliases = {}
+        self.lines = []
+
+    def reference(self, obj):
+        """Returns expression referencing given importable object."""
+        module = getattr(obj, "__module__", None)
+        qualname = getattr(obj, "__qualname__", None) or getattr(obj, "__name__", None)
+        if not module or not qualname or "<" in qualname:
+            raise exceptions.CompilerException("Object %r is not importable" % (obj,))
+
+        parts = qualname.split(".")
+        target = importlib.import_module(module)
+        for part in parts:
+            target = getattr(target, part, None)
+        if target is not obj:
+            raise exceptions.CompilerException("Object %r is not importable as %s.%s" % (obj, module, qualname))
+
+        key = (module, parts[0])
+        if not key in self._aliases:
+            alias = self._aliases[key] = "_i%d" % len(self._aliases)
+            self.lines.append("from %s import %s as %s" % (module, parts[0], alias))
+
+        return ".".join([self._aliases[key]] + parts[1:])
+
+class ContainerCompiler(object):
+    """Compiles :class:`glorpen.di.container.Container` services to Python module source."""
+
+    def __init__(self, container):
+        super(ContainerCompiler, self).__init__()
+        self.container = container
+        self.imports = _Imports()
+        self._getters = {}
+        self._pending = []
+        self._dependencies = {}
+        self._functions = []
+
+    def compile(self, services=None):
+        """Returns source of module with getters for given (or all) services and their dependencies."""
+        if services is None:
+            services = [k for k, v in self.container.services.items() if isinstance(v, Service)]
+
+        exported = {}
+        for svc in services:
+            name = normalize_name(svc)
+            exported[name] = self._get_getter(self._resolve_name(name))
+
+        while self._pending:
+            self._compile_service(self._pending.pop(0))
+
+        self._check_recursion()
+
+        # aliases and base classes of compiled services
+        for k, v in self.container.services.items():
+            if isinstance(v, Alias) and v.target in self._getters:
+                exported.setdefault(k, self._getters[v.target])
+        for k, v in self.container._type_index._bindings.items():
+            if isinstance(v, str) and v in self._getters:
+                exported.setdefault(k, self._getters[v])
+
+        lines = [
+            "# -*- coding: utf-8 -*-",
+            "# Generated by glorpen.di.compiler, do not edit.",
+            "",
+        ]
+        lines.extend(self.imports.lines)
+        lines.extend([
+            "",
+            "_instances = {}",
+            "",
+        ])
+        for function in self._functions:
+            lines.extend(function)
+            lines.append("")
+
+        lines.append("services = {")
+        for k in sorted(exported):
+            lines.append("    %r: %s," % (k, exported[k]))
+        lines.extend([
+            "}",
+            "",
+            "def get(svc):",
+            "    \"\"\"Gets service instance by name or class.\"\"\"",
+            "    if not isinstance(svc, str):",
+            "        svc = \"%s.%s\" % (svc.__module__, svc.__name__)",
+            "    return services[svc]()",
+            "",
+        ])
+
+        return "\n".join(lines)
+
+    def _resolve_name(self, name):
+        if name == self.container.self_service_name:
+            raise exceptions.CompilerException("Container cannot be injected into compiled services")
+
+        if not name in self.container.services:
+            bound = self.container._type_index.resolve(name)
+            if bound is None:
+                raise exceptions.UnknownServiceException(name)
+            name = bound
+
+        s_def = self.container._get_service_definition(name)
+        return s_def.name
+
+    def _get_getter(self, name):
+        if not name in self._getters:
+            getter = "get_%s" % re.sub(r"\W", "_", name)
+            while getter in self._getters.values():
+                getter += "_"
+            self._getters[name] = getter
+            self._pending.append(name)
+        return self._getters[name]
+
+    def _check_recursion(self):
+        done = set()
+
+        def visit(name, chain):
+            if name in chain:
+                raise exceptions.CompilerException("Dependency recursion error, chain was: %s" % " => ".join(chain + [name]))
+            if name in done:
+                return
+            for dep in self._dependencies.get(name, ()):
+                visit(dep, chain + [name])
+            done.add(name)
+
+        for name in tuple(self._dependencies):
+            visit(name, [])
+
+    def _service_call(self, svc, s_def):
+        name = self._resolve_name(normalize_name(svc))
+        dep = self.container.services[name]
+
+        if self.container.scopes_cls.get(dep._scope, 0) > self.container.scopes_cls.get(s_def._scope, 0):
+            raise exceptions.ScopeWideningException(dep, [s_def])
+
+        self._dependencies.setdefault(s_def.name, set()).add(name)
+        return "%s()" % self._get_getter(name)
+
+    def _literal(self, value):
+        if isinstance(value, _literal_types):
+            return repr(value)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            items = [self._literal(i) for i in value]
+            if isinstance(value, list):
+                return "[%s]" % ", ".join(items)
+            if isinstance(value, tuple):
+                return "(%s%s)" % (", ".join(items), "," if len(items) == 1 else "")
+            return "%s([%s])" % (type(value).__name__, ", ".join(items))
+        if isinstance(value, dict):
+            return "{%s}" % ", ".join("%s: %s" % (self._literal(k), self._literal(v)) for k, v in value.items())
+
+        return self.imports.reference(value)
+
+    def _value(self, value, s_def):
+        if not isinstance(value, Deffered):
+            return self._literal(value)
+
+        if value.service:
+            expr = self._service_call(value.service, s_def)
+            return "%s.%s" % (expr, value.method) if value.method else expr
+        if value.param:
+            return self._literal(self.container.get_parameter(value.param))
+        if value.tag:
+            return "[%s]" % ", ".join(self._service_call(i, s_def) for i in self.container._tag_index.get(value.tag))
+        if value.services is not None:
+            return "[%s]" % ", ".join(self._service_call(i, s_def) for i in value.services)
+
+        raise exceptions.CompilerException("Unsupported value %r" % (value,))
+
+    def _arguments(self, kwargs, s_def):
+        args = []
+        splat = []
+        for k in sorted(kwargs):
+            v = self._value(kwargs[k], s_def)
+            if _is_identifier(k):
+                args.append("%s=%s" % (k, v))
+            else:
+                splat.append("%r: %s" % (k, v))
+        if splat:
+            args.append("**{%s}" % ", ".join(splat))
+        return ", ".join(args)
+
+    def _compile_service(self, name):
+        container = self.container
+        s_def = container.services[name]
+
+        if s_def._scope is ScopeSingleton:
+            cached = True
+        elif s_def._scope is ScopePrototype:
+            cached = False
+        else:
+            raise exceptions.CompilerException("Scope %s of service %r is not supported" % (s_def._scope.__name__, name))
+
+        plan = container._get_plan(s_def)
+        lines = ["def %s():" % self._getters[name]]
+        if cached:
+            lines.extend([
+                "    try:",
+                "        return _instances[%r]" % name,
+                "    except KeyError:",
+                "        pass",
+            ])
+
+        if plan.factory is None:
+            cls = s_def._get_implementation()
+            factory = self._literal(cls)
+        else:
+            cls = None
+            factory = self._value(plan.factory, s_def)
+
+        if plan.load_signature:
+            if cls is None:
+                raise exceptions.CompilerException("Signature of factory of service %r cannot be inspected ahead of time" % name)
+            kwargs = container._get_constructor_arguments(plan, cls).as_dict()
+        else:
+            kwargs = plan.kwargs.as_dict()
+
+        if plan.kwargs_modifiers:
+            lines.append("    kwargs = dict(%s)" % self._arguments(kwargs, s_def))
+            for conf, arguments in plan.kwargs_modifiers:
+                args = self._arguments(arguments.as_dict(), s_def)
+                lines.append("    %s(kwargs%s)" % (self._value(conf, s_def), ", " + args if args else ""))
+            lines.append("    instance = %s(**kwargs)" % factory)
+        else:
+            lines.append("    instance = %s(%s)" % (factory, self._arguments(kwargs, s_def)))
+
+        def call_with_instance(conf, arguments):
+            args = self._arguments(arguments.as_dict(), s_def)
+            return "%s(instance%s)" % (self._value(conf, s_def), ", " + args if args else "")
+
+        for conf, arguments in plan.configurators:
+            lines.append("    %s" % call_with_instance(conf, arguments))
+
+        sets = plan.sets.as_dict()
+        for k in sorted(sets):
+            if _is_identifier(k):
+                lines.append("    instance.%s = %s" % (k, self._value(sets[k], s_def)))
+            else:
+                lines.append("    setattr(instance, %r, %s)" % (k, self._value(sets[k], s_def)))
+
+        for call in plan.calls:
+            kwargs = call.arguments.as_dict()
+            if call.use_signature:
+                if cls is None:
+                    raise exceptions.CompilerException("Signature of method %r of service %r cannot be inspected ahead of time" % (call.method, name))
+                container._update_kwargs_from_signature(getattr(cls, call.method), kwargs)
+            method = "instance.%s" % call.method if _is_identifier(call.method) else "getattr(instance, %r)" % call.method
+            lines.append("    %s(%s)" % (method, self._arguments(kwargs, s_def)))
+
+        for conf, arguments in plan.decorators:
+            lines.append("    instance = %s" % call_with_instance(conf, arguments))
+
+        if cached:
+            lines.append("    _instances[%r] = instance" % name)
+        lines.append("    return instance")
+
+        self._functions.append(lines)
+
+def compile_container(container, services=None):
+    """Returns source of Python module with getters for given (or all) services of *container*.
+
+    Raises:
+        CompilerException
+    """
+    if not isinstance(container, Container):
+        raise TypeError("Container instance expected")
+    return ContainerCompiler(container).compile(services)
@@ -4,32 +4,32 @@
 .. moduleauthor:: Arkadiusz Dzięgiel <arkadiusz.dziegiel@glorpen.pl>
 
 '''
-import inspect
-import functools
+import time
+import types
+import bisect
 import importlib
-import six
 
-from glorpen.di import exceptions
+from glorpen.di import exceptions, parameters
+from glorpen.di._compat import class_types, reraise, raise_from, threading
 from glorpen.di.scopes import ScopePrototype, ScopeSingleton, ScopeBase
 
-try:
-    from inspect import signature
-    signature_empty = inspect.Parameter.empty
-except ImportError:
-    from funcsigs import signature
-    from funcsigs import _empty as signature_empty
+_missing = object()
 
 def fluid(f):
     """Decorator for applying fluid pattern to class methods
     and to disallow calling when instance is marked as frozen.
     """
-    @functools.wraps(f)
     def wrapper(self, *args, **kwargs):
         if self._frozen:
             raise exceptions.ServiceAlreadyCreated(self.name)
         else:
             f(self, *args, **kwargs)
         return self
+    
+    wrapper.__name__ = f.__name__
+    wrapper.__doc__ = f.__doc__
+    wrapper.__module__ = f.__module__
+    wrapper.__wrapped__ = f
     return wrapper
 
 def normalize_name(o):
@@ -45,7 +45,7 @@ def normalize_name(o):
         Exception
     
     """
-    if inspect.isclass(o) or inspect.isfunction(o):
+    if isinstance(o, class_types) or isinstance(o, types.FunctionType):
         return "%s.%s" % (o.__module__, o.__name__)
     
     if isinstance(o, str):
@@ -58,14 +58,20 @@ class Deffered(object):
     
     Values are resolved by :class:`.Container` upon service creation.
     """
-    def __init__(self, service=None, method=None, param=None):
+    
+    #: tuple of container generation and bound method of service from persistent scope
+    _bound_method = None
+    
+    def __init__(self, service=None, method=None, param=None, tag=None, services=None):
         super(Deffered, self).__init__()
         self.service = service
         self.method = method
         self.param = param
+        self.tag = tag
+        self.services = services
     
-    def resolve(self, getter, param_getter):
-        """Given (service) getter and param_getter, returns resolved value."""
+    def resolve(self, getter, param_getter, tagged_getter=None):
+        """Given (service) getter, param_getter and tagged_getter, returns resolved value."""
         if self.service:
             svc = getter(self.service)
             if self.method:
@@ -74,6 +80,10 @@ class Deffered(object):
                 return svc
         if self.param:
             return param_getter(self.param)
+        if self.tag and tagged_getter:
+            return tagged_getter(self.tag)
+        if self.services is not None:
+            return [getter(i) for i in self.services]
         
         raise Exception()
 
@@ -98,6 +108,94 @@ class Kwargs(object):
         
         return ret
 
+class _Arguments(object):
+    """Call arguments precomputed from definition kwargs.
+    
+    Constant values are kept in prepared dict and reused as-is,
+    only :class:`.Deffered` ones are resolved on each call.
+    """
+    
+    __slots__ = ("static", "deffered")
+    
+    def __init__(self, kwargs):
+        super(_Arguments, self).__init__()
+        self.static = {}
+        deffered = []
+        for k, v in kwargs.items():
+            if isinstance(v, Deffered):
+                deffered.append((k, v))
+            else:
+                self.static[k] = v
+        self.deffered = tuple(deffered)
+    
+    def resolve(self, resolver):
+        """Returns resolved kwargs, returned dict should not be modified."""
+        if not self.deffered:
+            return self.static
+        kwargs = dict(self.static)
+        for k, v in self.deffered:
+            kwargs[k] = resolver(v)
+        return kwargs
+    
+    def as_dict(self):
+        kwargs = dict(self.static)
+        kwargs.update(self.deffered)
+        return kwargs
+
+class _MethodCall(object):
+    """Precomputed method call on created service.
+    
+    Method is looked up once per instance class and called as plain function,
+    so no bound method is created per service instance.
+    """
+    
+    def __init__(self, method, arguments, use_signature):
+        super(_MethodCall, self).__init__()
+        self.method = method
+        self.arguments = arguments
+        self.use_signature = use_signature
+        self._functions = {}
+        self._signature_arguments = {}
+    
+    def _find_function(self, cls):
+        mro = getattr(cls, "__mro__", None)
+        if mro is None or getattr(cls, "__getattribute__", None) is not object.__getattribute__:
+            return None
+        for klass in mro:
+            if self.method in klass.__dict__:
+                f = klass.__dict__[self.method]
+                return f if isinstance(f, types.FunctionType) else None
+        return None
+    
+    def get_function(self, instance):
+        """Returns unbound function to call with *instance* as first argument or `None` if method should be looked up on instance."""
+        # proxies (eg. mocks) can fake __class__, so real type is used
+        cls = type(instance)
+        try:
+            f = self._functions[cls]
+        except KeyError:
+            f = self._functions[cls] = self._find_function(cls)
+        
+        if f is None or self.method in getattr(instance, "__dict__", ()):
+            return None
+        return f
+
+class _CreationPlan(object):
+    """Service definition compiled for faster instance creation."""
+    
+    def __init__(self, s_def):
+        super(_CreationPlan, self).__init__()
+        self.factory = s_def._factory[0] if s_def._factory else None
+        self.implementation = None
+        self.kwargs = _Arguments(Kwargs.merge(s_def._factory[1] if s_def._factory else None, s_def._kwargs))
+        self.load_signature = s_def._load_signature
+        self.signature_arguments = {}
+        self.configurators = tuple((conf, _Arguments(params)) for conf, params in s_def._configurators)
+        self.decorators = tuple((conf, _Arguments(params)) for conf, params in s_def._decorators)
+        self.kwargs_modifiers = tuple((conf, _Arguments(params)) for conf, params in s_def._kwargs_modifiers)
+        self.sets = _Arguments(s_def._sets)
+        self.calls = tuple(_MethodCall(call_method, _Arguments(call_kwargs), use_sig) for use_sig, call_method, call_kwargs in s_def._calls)
+
 class Service(object):
     """Service definition.
     
@@ -105,6 +203,7 @@ class Service(object):
     
     - `my_var__svc=MyClass` - will inject service MyClass to `my_var`
     - `my_var__param="my.param"` - will inject parameter named "my.param" to `my_var`
+    - `my_var__tagged="my.tag"` - will inject list of services tagged with "my.tag" to `my_var`
     
     Implementation value for service can be:
     
@@ -122,14 +221,19 @@ class Service(object):
     _load_signature = False
     
     _frozen = False
+    _registry = None
+    _primary = False
+    _backoff = None
     
     def __init__(self, name_or_impl):
         super(Service, self).__init__()
         
+        self._tags = []
         self._kwargs = {}
         self._sets = {}
         self._calls = []
         self._configurators = []
+        self._decorators = []
         self._kwargs_modifiers = []
         
         self.name = normalize_name(name_or_impl)
@@ -149,17 +253,16 @@ class Service(object):
     def _lazy_import(self, path):
         """Wraps import path in callable returning class object"""
         module, cls = path.rsplit(".", 1)
-        @functools.wraps(self._lazy_import)
         def wrapper(*args, **kwargs):
             return getattr(importlib.import_module(module), cls)
         return wrapper
     
-    def _deffer(self, ret=None, svc=None, method=None, param=None):
+    def _deffer(self, ret=None, svc=None, method=None, param=None, tag=None):
         """Wraps value in :class:`.Deffered`. If *ret* argument is given it is returned unchanged."""
         if not ret is None:
             return ret
-        elif svc or param:
-            return Deffered(service=svc, method=method, param=param)
+        elif svc or param or tag:
+            return Deffered(service=svc, method=method, param=param, tag=tag)
     
     @fluid
     def implementation(self, v):
@@ -169,6 +272,8 @@ class Service(object):
             :class:`.Service`
         """
         self._impl = v
+        if self._registry:
+            self._registry._update_type_index(self)
     
     @fluid
     def factory(self, service=None, method=None, callable=None, kwargs=None, **kwargs_inline):
@@ -186,6 +291,8 @@ class Service(object):
                 kw[k[:-5]] = self._deffer(svc=v)
             elif k.endswith("__param"):
                 kw[k[:-7]] = self._deffer(param=v)
+            elif k.endswith("__tagged"):
+                kw[k[:-8]] = self._deffer(tag=v)
             else:
                 kw[k]=v
         return kw
@@ -236,6 +343,25 @@ class Service(object):
         if method or callable:
             self._configurators.append((self._deffer(svc=service, method=method, ret=callable), self._normalize_kwargs(kwargs_inline, kwargs)))
 
+    @fluid
+    def decorate(self, service=None, method=None, callable=None, kwargs=None, **kwargs_inline):
+        """Adds service or callable as decorator of this service.
+        
+        Decorators are called with instance of this service as first argument and should return object
+        which will be used instead of it (eg. a proxy or the same instance with wrapped methods).
+        They are applied in order of adding, after all configurators, setters and method calls.
+        
+        See :mod:`glorpen.di.interceptors` for built-in decorators.
+        
+        Args:
+            service + method, callable: given service method/callable will be called with instance of this service.
+        
+        Returns:
+            :class:`.Service`
+        """
+        if method or callable:
+            self._decorators.append((self._deffer(svc=service, method=method, ret=callable), self._normalize_kwargs(kwargs_inline, kwargs)))
+
     @fluid
     def kwargs_modifier(self, service=None, method=None, callable=None, kwargs=None, **kwargs_inline):
         """Adds service or callable as constructor arguments modifier of this service.
@@ -258,6 +384,31 @@ class Service(object):
         """
         self._load_signature = True
 
+    @fluid
+    def primary(self, value=True):
+        """Marks service as default implementation when many services share a base class.
+        
+        Returns:
+            :class:`.Service`
+        """
+        self._primary = value
+        if self._registry:
+            self._registry._update_type_index(self)
+    
+    @fluid
+    def tag(self, name, **attrs):
+        """Tags service with given name and attributes.
+        
+        Tagged services can be fetched with :meth:`.Container.get_tagged` or injected with `__tagged` argument suffix.
+        Services with higher `priority` attribute (default is 0) come first.
+        
+        Returns:
+            :class:`.Service`
+        """
+        self._tags.append((name, attrs))
+        if self._registry:
+            self._registry._add_tag(self, name, attrs)
+
     @fluid
     def scope(self, scope_cls):
         """Sets service scope.
@@ -266,6 +417,19 @@ class Service(object):
             :class:`.Service`
         """
         self._scope = scope_cls
+    
+    @fluid
+    def backoff(self, delay=1.0, max_delay=60.0, multiplier=2.0):
+        """Enables failure caching for this service.
+        
+        After failed creation, fetching this service raises the same error for *delay* seconds without trying to create it.
+        Each consecutive failure multiplies delay by *multiplier*, up to *max_delay* seconds.
+        When delay passes, single request is allowed to try again while others still fail fast.
+        
+        Returns:
+            :class:`.Service`
+        """
+        self._backoff = (delay, max_delay, multiplier)
 
 class Alias(object):
     """Alias for service."""
@@ -273,21 +437,321 @@ class Alias(object):
         super(Alias, self).__init__()
         self.target = normalize_name(target)
 
+class _TagIndex(object):
+    """Tagged service names, kept sorted by priority and registration order.
+    
+    Stored sequences are replaced instead of modified, so copies can share them.
+    """
+    def __init__(self):
+        super(_TagIndex, self).__init__()
+        self._entries = {}
+        self._names = {}
+        self._counter = 0
+    
+    def copy(self):
+        ret = _TagIndex()
+        ret._entries = dict(self._entries)
+        ret._names = dict(self._names)
+        ret._counter = self._counter
+        return ret
+    
+    def add(self, svc_name, tag, attrs):
+        self._counter += 1
+        entries = list(self._entries.get(tag, ()))
+        bisect.insort(entries, (-attrs.get("priority", 0), self._counter, svc_name))
+        self._entries[tag] = tuple(entries)
+        self._names[tag] = tuple(i[2] for i in entries)
+    
+    def remove_service(self, svc_name):
+        for tag, entries in tuple(self._entries.items()):
+            entries = tuple(i for i in entries if i[2] != svc_name)
+            if len(entries) != len(self._entries[tag]):
+                self._entries[tag] = entries
+                self._names[tag] = tuple(i[2] for i in entries)
+    
+    def get(self, tag):
+        """Returns sorted service names for given tag."""
+        return self._names.get(tag, ())
+
+class _TypeIndex(object):
+    """Maps classes (and their base classes) to names of services implementing them.
+    
+    Bound service for each class is precomputed on registration,
+    so looking up service by its base class is a single dict access.
+    Stored sequences are replaced instead of modified, so copies can share them.
+    """
+    def __init__(self):
+        super(_TypeIndex, self).__init__()
+        self._entries = {}
+        self._keys = {}
+        self._primary = frozenset()
+        self._bindings = {}
+    
+    def copy(self):
+        ret = _TypeIndex()
+        ret._entries = dict(self._entries)
+        ret._keys = dict(self._keys)
+        ret._primary = self._primary
+        ret._bindings = dict(self._bindings)
+        return ret
+    
+    def add_service(self, s_def):
+        self.remove_service(s_def.name)
+        if s_def._primary:
+            self._primary = self._primary | frozenset([s_def.name])
+        impl = s_def._impl or s_def._name_or_impl
+        keys = []
+        # old-style classes have no __mro__ and are not indexed
+        for cls in getattr(impl, "__mro__", ()):
+            if cls is object:
+                continue
+            k = normalize_name(cls)
+            keys.append(k)
+            self._entries[k] = self._entries.get(k, ()) + (s_def.name,)
+            self._update_binding(k)
+        if keys:
+            self._keys[s_def.name] = tuple(keys)
+    
+    def remove_service(self, svc_name):
+        if svc_name in self._primary:
+            self._primary = self._primary - frozenset([svc_name])
+        for k in self._keys.pop(svc_name, ()):
+            names = tuple(i for i in self._entries[k] if i != svc_name)
+            if names:
+                self._entries[k] = names
+            else:
+                del self._entries[k]
+            self._update_binding(k)
+    
+    def _update_binding(self, name):
+        names = self._entries.get(name)
+        if not names:
+            self._bindings.pop(name, None)
+            return
+        
+        primary = [i for i in names if i in self._primary]
+        if len(primary) == 1:
+            self._bindings[name] = primary[0]
+        elif len(names) == 1:
+            self._bindings[name] = names[0]
+        else:
+            self._bindings[name] = tuple(primary or names)
+    
+    def get(self, name):
+        """Returns names of services implementing given class name."""
+        return self._entries.get(name, ())
+    
+    def resolve(self, name):
+        """Returns name of service bound to given class name or `None`.
+        
+        Raises:
+            AmbiguousServiceException
+        """
+        bound = self._bindings.get(name)
+        if bound.__class__ is tuple:
+            raise exceptions.AmbiguousServiceException(name, bound)
+        return bound
+
+class _Definitions(object):
+    """Snapshot of service definitions and indexes built from them.
+    
+    Snapshots are not modified after being published, changes are made on a copy.
+    Snapshot is published on first read, until then it is modified in place,
+    so registering many services one by one is not slowed down by copying.
+    """
+    
+    __slots__ = ("services", "tag_index", "type_index", "published")
+    
+    def __init__(self, services=None, tag_index=None, type_index=None):
+        super(_Definitions, self).__init__()
+        self.services = {} if services is None else services
+        self.tag_index = _TagIndex() if tag_index is None else tag_index
+        self.type_index = _TypeIndex() if type_index is None else type_index
+        self.published = False
+    
+    def copy(self):
+        return _Definitions(dict(self.services), self.tag_index.copy(), self.type_index.copy())
+
+class _CircuitBreaker(object):
+    """Failure state of service with enabled :meth:`.Service.backoff`."""
+    
+    def __init__(self, backoff, clock):
+        super(_CircuitBreaker, self).__init__()
+        self.delay, self.max_delay, self.multiplier = backoff
+        self.clock = clock
+        
+        self.failures = 0
+        self.total_failures = 0
+        self.rejected = 0
+        self.error = None
+        self.retry_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+    
+    def call(self, creator):
+        probe = False
+        if self.error is not None:
+            with self._lock:
+                if self.error is not None:
+                    if self.probing or self.clock() < self.retry_at:
+                        self.rejected += 1
+                        reraise(self.error)
+                    self.probing = probe = True
+        
+        try:
+            instance = creator()
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+                self.total_failures += 1
+                self.error = e
+                self.retry_at = self.clock() + min(self.delay * self.multiplier ** (self.failures - 1), self.max_delay)
+            raise
+        finally:
+            # also on KeyboardInterrupt and other non Exception errors
+            if probe:
+                self.probing = False
+        
+        if self.error is not None:
+            with self._lock:
+                self.failures = 0
+                self.error = None
+                self.retry_at = None
+        
+        return instance
+    
+    def stats(self):
+        if self.error is None:
+            state = "closed"
+        elif self.probing:
+            state = "half-open"
+        else:
+            state = "open"
+        
+        return {
+            "state": state,
+            "failures": self.failures,
+            "total_failures": self.total_failures,
+            "rejected": self.rejected,
+            "retry_at": self.retry_at,
+            "last_error": self.error,
+        }
+
+class _OverridesContext(object):
+    def __init__(self, container):
+        super(_OverridesContext, self).__init__()
+        self.container = container
+    
+    def __enter__(self):
+        self.container.push_overrides()
+        return self.container
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.container.pop_overrides()
+
+class _ResolutionCache(object):
+    """Holds services resolved during single :meth:`.Container.get_many` call."""
+    def __init__(self, share_prototypes=False):
+        super(_ResolutionCache, self).__init__()
+        self.share_prototypes = share_prototypes
+        self.entries = {}
+    
+    def _key(self, name, s_def, scope):
+        # persistent scopes keep instances by service name (or alias), other ones are shared by definition
+        return name if scope.persistent else s_def.name
+    
+    def get(self, name, s_def, scope):
+        """Returns already resolved instance or `_missing`."""
+        return self.entries.get(self._key(name, s_def, scope), _missing)
+    
+    def add(self, name, s_def, scope, instance):
+        if self.share_prototypes or scope.persistent:
+            self.entries[self._key(name, s_def, scope)] = instance
+
 class Container(object):
     """Implementation of DIC container."""
     
     scopes_cls = []
     scopes = []
     
+    _tracer = None
+    
+    #: callable returning current time in seconds, used by :meth:`.Service.backoff`
+    clock = staticmethod(getattr(time, "monotonic", time.time))
+    
     def __init__(self):
         super(Container, self).__init__()
-        self.services = {}
-        self.parameters = {}
+        self._instances = {}
+        self._generation = object()
+        self._definitions = _Definitions()
+        # raw and resolved values are replaced together, so resolving never mixes two versions
+        self._parameters = ({}, {})
+        self._plans = {}
+        self._dependents = {}
+        self._override_layers = []
+        self._breakers = {}
+        self.definitions_version = 0
+        
+        # serializes definition changes, fetching services does not take it
+        self._lock = threading.RLock()
         
         self.self_service_name = normalize_name(self.__class__)
         
         self.set_scope_hierarchy(ScopeSingleton, ScopePrototype)
         
+    def _drop_cached_instances(self):
+        """Clears fast path cache and marks all cached bound methods as outdated."""
+        # new dict is created, so instances stored by fetches started before are dropped too
+        self._generation = object()
+        self._instances = {}
+    
+    def _snapshot(self):
+        """Returns definitions for reading, later changes will be made on a copy."""
+        definitions = self._definitions
+        if not definitions.published:
+            # taken once per snapshot, so it is not read while writer still modifies it in place
+            with self._lock:
+                definitions = self._definitions
+                definitions.published = True
+        return definitions
+    
+    def _writable_definitions(self):
+        """Returns definitions that can be modified by writer holding the lock."""
+        definitions = self._definitions
+        if definitions.published:
+            # copied on write, so threads fetching services always see complete snapshot
+            definitions = definitions.copy()
+        return definitions
+    
+    @property
+    def services(self):
+        """Dict of registered service definitions and aliases, should not be modified."""
+        return self._snapshot().services
+    
+    @property
+    def parameters(self):
+        """Dict of raw parameter values, should not be modified - use :meth:`.add_parameter` instead."""
+        return self._parameters[0]
+    
+    @property
+    def _tag_index(self):
+        return self._snapshot().tag_index
+    
+    @property
+    def _type_index(self):
+        return self._snapshot().type_index
+    
+    @property
+    def tracer(self):
+        """Instance of :class:`glorpen.di.tracing.Tracer`, when set service fetching will be traced."""
+        return self._tracer
+    
+    @tracer.setter
+    def tracer(self, tracer):
+        # instances fetched by fast path would not be traced
+        self._drop_cached_instances()
+        self._tracer = tracer
+    
     def set_scope_hierarchy(self, *scopes):
         """Sets used scopes hierarchy.
         
@@ -310,8 +774,10 @@ class Container(object):
                 my_scopes.append(scope())
                 my_scopes_cls.append(scope)
         
-        self.scopes = tuple(my_scopes)
-        self.scopes_cls = dict([(o,i) for i,o in enumerate(tuple(my_scopes_cls))])
+        with self._lock:
+            self.scopes = tuple(my_scopes)
+            self.scopes_cls = dict([(o,i) for i,o in enumerate(tuple(my_scopes_cls))])
+            self._drop_cached_instances()
     
     def add_service(self, name):
         """Adds service definition to this container.
@@ -323,20 +789,175 @@ class Container(object):
         
         """
         s = Service(name)
-        self.services[s.name] = s
+        self._set_definition(s.name, s)
+        return s
+    
+    def _set_definition(self, name, s_def):
+        with self._lock:
+            definitions = self._writable_definitions()
+            
+            if name in definitions.services:
+                definitions.tag_index.remove_service(name)
+                definitions.type_index.remove_service(name)
+            
+            if s_def is None:
+                definitions.services.pop(name, None)
+            else:
+                s_def._registry = self
+                definitions.services[name] = s_def
+                for tag, attrs in s_def._tags:
+                    definitions.tag_index.add(name, tag, attrs)
+                definitions.type_index.add_service(s_def)
+            
+            self._definitions = definitions
+            self._plans.clear()
+            self._breakers.pop(name, None)
+            self._drop_cached_instances()
+            self.definitions_version += 1
+    
+    def _update_type_index(self, s_def):
+        """Updates base class bindings after definition implementation or primary flag was changed."""
+        with self._lock:
+            if self._definitions.services.get(s_def.name) is s_def:
+                definitions = self._writable_definitions()
+                definitions.type_index.add_service(s_def)
+                self._definitions = definitions
+                # autowired arguments in creation plans are resolved from indexes
+                self._plans.clear()
+                self._drop_cached_instances()
+                self.definitions_version += 1
+    
+    def _add_tag(self, s_def, tag, attrs):
+        with self._lock:
+            if self._definitions.services.get(s_def.name) is s_def:
+                definitions = self._writable_definitions()
+                definitions.tag_index.add(s_def.name, tag, attrs)
+                self._definitions = definitions
+                self._plans.clear()
+                self._drop_cached_instances()
+                self.definitions_version += 1
+    
+    def override_service(self, name):
+        """Replaces service definition and drops instances of it and of all services depending on it.
+        
+        Other created instances are left intact.
+        When called after :meth:`.push_overrides`, previous definition will be restored by :meth:`.pop_overrides`.
+        
+        Returns:
+            :class:`.Service`
+        """
+        s = Service(name)
+        with self._lock:
+            if self._override_layers:
+                self._override_layers[-1].setdefault(s.name, self._definitions.services.get(s.name))
+            self._set_definition(s.name, s)
+            self.invalidate(s.name)
         return s
     
+    def push_overrides(self):
+        """Starts new layer of service overrides."""
+        self._override_layers.append({})
+    
+    def pop_overrides(self):
+        """Restores definitions replaced by :meth:`.override_service` since last :meth:`.push_overrides`."""
+        with self._lock:
+            layer = self._override_layers.pop()
+            for name, s_def in layer.items():
+                self._set_definition(name, s_def)
+                self.invalidate(name)
+    
+    def overrides(self):
+        """Context manager for :meth:`.push_overrides` and :meth:`.pop_overrides`."""
+        return _OverridesContext(self)
+    
+    def invalidate(self, svc):
+        """Drops scoped instances of given service and of all services that depend on it (directly or not).
+        
+        Returns:
+            set of invalidated service names
+        """
+        name = normalize_name(svc)
+        
+        with self._lock:
+            invalidated = set()
+            pending = [name]
+            while pending:
+                n = pending.pop()
+                if n in invalidated:
+                    continue
+                invalidated.add(n)
+                pending.extend(self._dependents.pop(n, ()))
+            
+            keys = set(invalidated)
+            for k, v in self._definitions.services.items():
+                if isinstance(v, Alias) and v.target in invalidated:
+                    keys.add(k)
+            
+            for scope in self.scopes:
+                for k in keys:
+                    scope.invalidate(k)
+            for k in invalidated:
+                self._breakers.pop(k, None)
+            self._drop_cached_instances()
+        
+        return invalidated
+    
     def add_alias(self, service, alias):
         """Adds an alias for given service"""
         a = Alias(service)
-        if not a.target in self.services or not isinstance(self.services[a.target], Service):
-            raise exceptions.InvalidAliasTargetException(a.target)
-        self.services[alias] = a
+        with self._lock:
+            services = self._definitions.services
+            if not a.target in services or not isinstance(services[a.target], Service):
+                raise exceptions.InvalidAliasTargetException(a.target)
+            definitions = self._writable_definitions()
+            definitions.services[alias] = a
+            self._definitions = definitions
+            self._plans.clear()
+            self._drop_cached_instances()
+            self.definitions_version += 1
         return a
     
-    def add_parameter(self, name, value):
-        """Adds a key-value parameter."""
-        self.parameters[name] = value
+    def add_parameter(self, name, value, interpolate=False):
+        """Adds a key-value parameter.
+        
+        Value is used verbatim unless it is :class:`glorpen.di.parameters.Reference` or *interpolate* is set,
+        then string can reference other parameters with `%other.param%` syntax.
+        References are resolved on first :meth:`.get_parameter` call.
+        """
+        if interpolate and isinstance(value, str):
+            value = parameters.Reference(value)
+        with self._lock:
+            params = dict(self.parameters)
+            params[name] = value
+            self._parameters = (params, {})
+    
+    def add_lazy_parameter(self, name, factory):
+        """Adds a parameter which value is computed by *factory* callable on first use."""
+        self.add_parameter(name, parameters.LazyParameter(factory))
+    
+    def load_parameters(self, values=None, files=(), env_prefix=None, environ=None, interpolate=False):
+        """Adds parameters from many sources at once.
+        
+        Sources are loaded in order: *values* dict, JSON *files*, then environment variables
+        (see :func:`glorpen.di.parameters.from_environ`) when *env_prefix* is given.
+        Later sources override earlier ones.
+        With *interpolate* string values are treated as :class:`glorpen.di.parameters.Reference` templates.
+        """
+        params = dict(values or ())
+        for path in files:
+            params.update(parameters.from_file(path))
+        if env_prefix is not None:
+            params.update(parameters.from_environ(env_prefix, environ))
+        
+        if interpolate:
+            for k, v in params.items():
+                if isinstance(v, str):
+                    params[k] = parameters.Reference(v)
+        
+        with self._lock:
+            merged = dict(self.parameters)
+            merged.update(params)
+            self._parameters = (merged, {})
     
     def get(self, svc):
         """Gets service instance.
@@ -346,9 +967,91 @@ class Container(object):
         
         """
         try:
-            return self._get(svc)
+            return self._instances[svc]
+        except KeyError:
+            pass
+        
+        try:
+            return self._get(svc, fast_key=svc)
+        except exceptions.ContainerException as e:
+            reraise(e)
+    
+    def get_many(self, *services, **options):
+        """Gets instances of many services in one pass.
+        
+        By default it is about as fast as calling :meth:`.get` in a loop, since singletons are already cached by container.
+        With *share_prototypes=True* option, services from other scopes than
+        :class:`glorpen.di.scopes.ScopeSingleton` are created once and reused in whole pass,
+        which is where the speedup comes from.
+        
+        Returns:
+            list of instances, in order of requested services
+        
+        Raises:
+            UnkownServiceException
+        
+        """
+        resolved = self._create_resolution_cache(**options)
+        try:
+            return [self._get(svc, resolved=resolved) for svc in services]
         except exceptions.ContainerException as e:
-            six.reraise(e.__class__, e)
+            reraise(e)
+    
+    def create_many(self, svc, n, per_instance_kwargs=None, share_prototypes=False):
+        """Creates *n* new instances of given service, lazily.
+        
+        Dependencies from persistent scopes (eg. singletons) are resolved once and shared by all created instances.
+        Dependencies from other scopes are created for each instance, as with :meth:`.get`,
+        unless *share_prototypes* is set.
+        Created instances are not stored in service scope.
+        
+        Args:
+            svc: service name or class
+            n (int): count of instances to create
+            per_instance_kwargs: iterable of dicts or callable accepting instance index and returning dict,
+                returned constructor arguments override ones from service definition
+        
+        Returns:
+            generator of instances
+        """
+        name = normalize_name(svc)
+        if name == self.self_service_name:
+            raise exceptions.ContainerException("Container instance cannot be created")
+        name, s_def, _ = self._lookup(name)
+        
+        return self._create_many(s_def, n, per_instance_kwargs, share_prototypes)
+    
+    def _create_many(self, s_def, n, per_instance_kwargs, share_prototypes):
+        resolver = self._create_resolver(s_def, [], self._create_resolution_cache(share_prototypes))
+        
+        if per_instance_kwargs is None:
+            for _ in range(n):
+                yield self._create(s_def, resolver)
+        elif callable(per_instance_kwargs):
+            for i in range(n):
+                yield self._create(s_def, resolver, per_instance_kwargs(i))
+        else:
+            for _, kwargs in zip(range(n), per_instance_kwargs):
+                yield self._create(s_def, resolver, kwargs)
+    
+    def get_many_dict(self, *services, **options):
+        """Same as :meth:`.get_many` but returns dict with requested services as keys.
+        
+        Returns:
+            dict
+        """
+        return dict(zip(services, self.get_many(*services, **options)))
+    
+    def _create_resolution_cache(self, share_prototypes=False):
+        return _ResolutionCache(share_prototypes)
+    
+    def get_tagged(self, tag):
+        """Gets instances of services tagged with *tag*, sorted by priority.
+        
+        Returns:
+            list
+        """
+        return self.get_many(*self._tag_index.get(tag))
     
     def get_parameter(self, name):
         """Gets parameter.
@@ -357,121 +1060,385 @@ class Container(object):
             UnkownParameterException
         
         """
-        if name in self.parameters:
-            return self.parameters[name]
-        else:
+        params, resolved = self._parameters
+        try:
+            return resolved[name]
+        except KeyError:
+            return self._resolve_parameter(name, (), params, resolved)
+    
+    def _resolve_parameter(self, name, chain, params, resolved):
+        if name in resolved:
+            return resolved[name]
+        
+        if not name in params:
             raise exceptions.UnknownParameterException(name)
+        
+        if name in chain:
+            raise exceptions.ParameterRecursionException(chain + (name,))
+        
+        value = params[name]
+        if isinstance(value, parameters.LazyParameter):
+            value = value.get()
+        elif isinstance(value, parameters.Reference):
+            value = parameters.interpolate(value.template, lambda ref: self._resolve_parameter(ref, chain + (name,), params, resolved))
+        
+        resolved[name] = value
+        return value
+    
+    def warm_up(self, services=None, freeze_gc=False):
+        """Creates given services or all services in persistent scopes (eg. singletons).
+    
+        With *freeze_gc* created objects are moved to permanent generation by :func:`gc.freeze` (when available),
+        so garbage collector does not touch them and memory pages stay shared in processes forked afterwards.
+        """
+        if services is None:
+            services = []
+            for name, s_def in self.services.items():
+                if isinstance(s_def, Service) and self.scopes[self._lookup(name)[2]].persistent:
+                    services.append(name)
+    
+        for svc in services:
+            self.get(svc)
+    
+        if freeze_gc:
+            import gc
+            if hasattr(gc, "freeze"):
+                gc.collect()
+                gc.freeze()
+    
+    def memory_report(self):
+        """Computes approximate memory retained by instances held in scopes, see :mod:`glorpen.di.memory`.
+    
+        Returns:
+            :class:`glorpen.di.memory.MemoryReport`
+        """
+        from glorpen.di.memory import memory_report
+        return memory_report(self)
     
     def get_definition(self, svc):
         """Returns definition for given service name."""
         name = normalize_name(svc)
-        if not name in self.services:
-            raise exceptions.UnknownServiceException(name)
+        definitions = self._snapshot()
+        if not name in definitions.services:
+            name = definitions.type_index.resolve(name)
+            if name is None:
+                raise exceptions.UnknownServiceException(normalize_name(svc))
         
-        return self.services[name]
+        return definitions.services[name]
     
-    def _get_service_definition(self, name):
-        s = self.services.get(name)
+    def _get_service_definition(self, name, services=None):
+        if services is None:
+            services = self.services
+        s = services.get(name)
         if hasattr(s, "target"):
-            return self.services.get(s.target)
+            return services.get(s.target)
         return s
     
-    def _get(self, svc, requester_chain=None):
+    def _get(self, svc, requester_chain=None, resolved=None, fast_key=None):
         name = normalize_name(svc)
         
         if name == self.self_service_name:
             return self
         
-        if not name in self.services:
-            raise exceptions.UnknownServiceException(name)
+        while True:
+            # captured before lookup, so definitions changed or instances invalidated while creating are noticed
+            generation = self._generation
+            instances = self._instances
+            
+            found, s_def, scope_index = self._lookup(name)
+            scope = self.scopes[scope_index]
+            
+            if resolved is not None:
+                # checked after lookup, so services requested by alias or base class are shared too
+                instance = resolved.get(found, s_def, scope)
+                if instance is not _missing:
+                    if requester_chain:
+                        self._check_scope_widening(s_def, scope_index, requester_chain)
+                        self._add_dependent(s_def, requester_chain)
+                    return instance
+            
+            if not requester_chain:
+                requester_chain = []
+            else:
+                self._check_scope_widening(s_def, scope_index, requester_chain)
+                self._add_dependent(s_def, requester_chain)
+            
+            resolver = self._create_resolver(s_def, requester_chain, resolved)
+            
+            def service_creator():
+                return self._create(s_def, resolver)
+            
+            if s_def._backoff is not None:
+                service_creator = self._with_breaker(s_def, service_creator)
+            
+            if self._tracer is None:
+                instance = scope.get(service_creator, found)
+            else:
+                instance = self._get_traced(scope, service_creator, found, s_def)
+            
+            if self._generation is generation:
+                break
+            
+            # instance could be created from outdated definition or after its invalidation,
+            # so it is dropped from scope and fetched again
+            scope.invalidate(found)
+        
+        if fast_key is not None and scope.persistent and self._tracer is None:
+            instances[fast_key] = instance
         
-        s_def = self._get_service_definition(name)
+        if resolved is not None:
+            resolved.add(found, s_def, scope, instance)
+        
+        return instance
+    
+    def _with_breaker(self, s_def, creator):
+        breaker = self._breakers.get(s_def.name)
+        if breaker is None:
+            breaker = self._breakers.setdefault(s_def.name, _CircuitBreaker(s_def._backoff, self.clock))
+        return lambda: breaker.call(creator)
+    
+    def failure_stats(self):
+        """Returns failure caching stats of services with enabled :meth:`.Service.backoff`.
+        
+        Returns:
+            dict of service name to dict with `state` ("closed", "open" or "half-open"), consecutive `failures`,
+            `total_failures`, count of `rejected` requests, `retry_at` time and `last_error`
+        """
+        return dict((name, breaker.stats()) for name, breaker in tuple(self._breakers.items()))
+    
+    def _lookup(self, name):
+        """Returns tuple of service name (after resolving base class bindings), definition and scope index."""
+        # single snapshot is used, so definitions changed meanwhile by other thread are not mixed
+        definitions = self._snapshot()
+        if not name in definitions.services:
+            bound = definitions.type_index.resolve(name)
+            if bound is None:
+                raise exceptions.UnknownServiceException(name)
+            name = bound
+        
+        s_def = self._get_service_definition(name, definitions.services)
         
         my_scope = s_def._scope
         
         if not my_scope in self.scopes_cls:
             raise exceptions.UnknownScopeException(my_scope, s_def)
         
-        scope_index = self.scopes_cls[my_scope]
-        
-        if not requester_chain:
-            requester_chain = []
-        else:
-            requester_scope = requester_chain[-1]._scope
-            if requester_scope and scope_index > self.scopes_cls[requester_scope]:
-                raise exceptions.ScopeWideningException(s_def, requester_chain)
-        
+        return name, s_def, self.scopes_cls[my_scope]
+    
+    def _create_resolver(self, s_def, requester_chain, resolved=None):
         def resolver(value):
             if isinstance(value, Deffered):
+                if value.method:
+                    cached = value._bound_method
+                    if cached is not None and cached[0] is self._generation:
+                        return cached[1]
+                
                 if s_def in requester_chain:
                     raise exceptions.RecursionException(s_def, requester_chain)
-                return value.resolve(lambda name:self._get(name, requester_chain + [s_def]), self.get_parameter)
+                generation = self._generation
+                ret = value.resolve(
+                    lambda name:self._get(name, requester_chain + [s_def], resolved),
+                    self.get_parameter,
+                    lambda tag:[self._get(name, requester_chain + [s_def], resolved) for name in self._tag_index.get(tag)]
+                )
+                
+                if value.method and value.service:
+                    self._cache_bound_method(value, ret, generation)
+                
+                return ret
             else:
                 return value
+        return resolver
+    
+    def _cache_bound_method(self, value, bound_method, generation):
+        """Caches bound method of service from persistent scope on given :class:`.Deffered`."""
+        if self._tracer is not None or generation is not self._generation:
+            return
+        name, _, scope_index = self._lookup(normalize_name(value.service))
+        if self.scopes[scope_index].persistent:
+            value._bound_method = (generation, bound_method)
+    
+    def _get_traced(self, scope, service_creator, name, s_def):
+        span = self._tracer.start_span("glorpen.di %s" % name, {
+            "di.service": name,
+            "di.scope": s_def._scope.__name__,
+            "di.factory": bool(s_def._factory),
+        })
+        created = []
         
-        def service_creator():
-            return self._create(s_def, resolver)
+        def traced_creator():
+            created.append(True)
+            return service_creator()
         
-        return self.scopes[scope_index].get(service_creator, name)
+        try:
+            instance = scope.get(traced_creator, name)
+        except Exception as e:
+            span.set_attribute("di.failed", True)
+            span.record_exception(e)
+            raise
+        else:
+            span.set_attribute("di.failed", False)
+        finally:
+            span.set_attribute("di.cache_hit", not created)
+            span.end()
+        
+        return instance
+    
+    def _add_dependent(self, s_def, requester_chain):
+        try:
+            self._dependents[s_def.name].add(requester_chain[-1].name)
+        except KeyError:
+            self._dependents[s_def.name] = set([requester_chain[-1].name])
+    
+    def _check_scope_widening(self, s_def, scope_index, requester_chain):
+        requester_scope = requester_chain[-1]._scope
+        if requester_scope and scope_index > self.scopes_cls[requester_scope]:
+            raise exceptions.ScopeWideningException(s_def, requester_chain)
+    
+    def _find_implementations(self, hint):
+        if isinstance(hint, str):
+            return (hint,) if hint in self.services else ()
+        
+        if not isinstance(hint, class_types):
+            return ()
+        
+        name = normalize_name(hint)
+        implementations = self._type_index.get(name)
+        if name in self.services and not name in implementations:
+            return (name,) + tuple(implementations)
+        return implementations
+    
+    def _find_service_name(self, hint):
+        if isinstance(hint, str):
+            return hint if hint in self.services else None
+        
+        if not isinstance(hint, class_types):
+            return None
+        
+        name = normalize_name(hint)
+        if name in self.services:
+            return name
+        
+        return self._type_index.resolve(name)
+    
+    def _autowire(self, requirement):
+        """Returns value for given :class:`glorpen.di.autowiring.Requirement` or `_missing` if it cannot be satisfied."""
+        if requirement.many:
+            names = []
+            for hint in requirement.candidates:
+                names.extend(i for i in self._find_implementations(hint) if not i in names)
+            if not names and requirement.has_default:
+                return _missing
+            return Deffered(services=tuple(names))
+        
+        for hint in requirement.candidates:
+            name = self._find_service_name(hint)
+            if name:
+                return Deffered(service=name)
+        
+        # explicit default is left for function to use
+        if requirement.optional and not requirement.has_default:
+            return None
+        
+        return _missing
     
     def _update_kwargs_from_signature(self, function, kwargs):
+        # imported on first use, inspecting signatures requires heavy modules
+        from glorpen.di import autowiring
+        
+        for requirement in autowiring.get_requirements(function):
+            if not requirement.name in kwargs:
+                value = self._autowire(requirement)
+                if value is not _missing:
+                    kwargs[requirement.name] = value
+    
+    def _get_plan(self, s_def):
         try:
-            sig = signature(function)
-        except ValueError:
-            return
+            return self._plans[s_def]
+        except KeyError:
+            plan = self._plans[s_def] = _CreationPlan(s_def)
+            return plan
+    
+    def _get_constructor_arguments(self, plan, cls):
+        # bound methods of prototype factories are new objects on each creation,
+        # keying by them would keep every factory instance alive
+        key = getattr(cls, "__func__", cls)
+        try:
+            return plan.signature_arguments[key]
+        except KeyError:
+            kwargs = plan.kwargs.as_dict()
+            self._update_kwargs_from_signature(cls.__init__, kwargs)
+            arguments = plan.signature_arguments[key] = _Arguments(kwargs)
+            return arguments
+    
+    def _call_method(self, call, instance, resolver):
+        f = call.get_function(instance)
+        if f is None:
+            method = getattr(instance, call.method)
+            if call.use_signature:
+                kwargs = call.arguments.as_dict()
+                self._update_kwargs_from_signature(method, kwargs)
+                arguments = _Arguments(kwargs)
+            else:
+                arguments = call.arguments
+            return method(**arguments.resolve(resolver))
         
-        for name, param in tuple(sig.parameters.items()):
-            if name == "self":
-                continue
-            
-            if param.annotation is signature_empty:
-                continue
-            n = normalize_name(param.annotation)
-            if n in self.services:
-                kwargs.setdefault(name, Deffered(service=n))
+        if call.use_signature:
+            try:
+                arguments = call._signature_arguments[f]
+            except KeyError:
+                kwargs = call.arguments.as_dict()
+                self._update_kwargs_from_signature(f, kwargs)
+                arguments = call._signature_arguments[f] = _Arguments(kwargs)
+        else:
+            arguments = call.arguments
         
+        return f(instance, **arguments.resolve(resolver))
     
-    def _create(self, s_def, resolver):
+    def _create(self, s_def, resolver, extra_kwargs=None):
         
         s_def._frozen = True
+        plan = self._get_plan(s_def)
         
-        def resolve_kwargs(kwargs):
-            return dict([(k, resolver(v)) for k,v in kwargs.items()])
+        if plan.factory is None:
+            cls = plan.implementation
+            if cls is None:
+                cls = plan.implementation = s_def._get_implementation()
+        else:
+            cls = resolver(plan.factory)
         
-        if s_def._factory:
-            cls = resolver(s_def._factory[0])
-            kwargs = s_def._factory[1]
+        if plan.load_signature:
+            kwargs = self._get_constructor_arguments(plan, cls).resolve(resolver)
         else:
-            cls = s_def._get_implementation()
-            kwargs = {}
+            kwargs = plan.kwargs.resolve(resolver)
         
-        kwargs.update(s_def._kwargs)
-        self._update_kwargs_from_signature(cls.__init__, kwargs)
-        kwargs = resolve_kwargs(kwargs)
+        if extra_kwargs:
+            kwargs = dict(kwargs)
+            kwargs.update(extra_kwargs)
         
-        for conf, params in s_def._kwargs_modifiers:
-            resolver(conf)(kwargs, **resolve_kwargs(params))
+        if plan.kwargs_modifiers:
+            kwargs = dict(kwargs)
+            for conf, arguments in plan.kwargs_modifiers:
+                resolver(conf)(kwargs, **arguments.resolve(resolver))
         
         try:
             instance = cls(**kwargs)
         except Exception as e:
-            six.raise_from(exceptions.InjectionException(s_def.name, cls), e)
+            raise_from(exceptions.InjectionException(s_def.name, cls), e)
         
-        for conf, params in s_def._configurators:
-            resolver(conf)(instance, **resolve_kwargs(params))
+        for conf, arguments in plan.configurators:
+            resolver(conf)(instance, **arguments.resolve(resolver))
         
-        for k,v in resolve_kwargs(s_def._sets).items():
+        for k,v in plan.sets.resolve(resolver).items():
             setattr(instance, k, v)
         
-        for use_sig, call_method, call_kwargs in s_def._calls:
-            callable = getattr(instance, call_method)
-            kwargs = dict(call_kwargs)
-            if use_sig:
-                self._update_kwargs_from_signature(callable, kwargs)
-            
+        for call in plan.calls:
             try:
-                callable(**resolve_kwargs(kwargs))
+                self._call_method(call, instance, resolver)
             except Exception as e:
-                six.raise_from(exceptions.InjectionException(s_def.name, cls, call_method), e)
+                raise_from(exceptions.InjectionException(s_def.name, cls, call.method), e)
+        
+        for conf, arguments in plan.decorators:
+            instance = resolver(conf)(instance, **arguments.resolve(resolver))
         
         return instance
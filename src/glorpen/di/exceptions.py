@@ -31,11 +31,27 @@ class UnknownServiceException(ContainerException):
     def __init__(self, svc_name):
         super(UnknownServiceException, self).__init__("Unknown service %r" % (svc_name,))
 
+class AmbiguousServiceException(ContainerException):
+    """Raised when requesting service by base class which is implemented by many services and none of them is marked as primary."""
+    def __init__(self, name, candidates):
+        super(AmbiguousServiceException, self).__init__(
+            "Service %r is implemented by many services: %s"
+            % (name, ", ".join(candidates))
+        )
+
 class UnknownParameterException(ContainerException):
     """Raised when requesting parameter which is not registered in :class:`glorpen.di.container.Container`."""
     def __init__(self, name):
         super(UnknownParameterException, self).__init__("Unknown parameter %r" % (name,))
 
+class ParameterRecursionException(ContainerException):
+    """Raised when parameter is referencing itself."""
+    def __init__(self, chain):
+        super(ParameterRecursionException, self).__init__(
+             "Parameter recursion error, chain was: %s"
+             % (" => ".join(chain))
+        )
+
 class ScopeWideningException(ContainerException):
     """Raised when *Service A* depends on *Service B* from narrower scope."""
     def __init__(self, s_def, requester_chain):
@@ -66,3 +82,7 @@ class InvalidAliasTargetException(ContainerException):
             "Service %r does not exists or is an alias"
             % name
         )
+
+class CompilerException(ContainerException):
+    """Raised when container cannot be compiled by :mod:`glorpen.di.compiler`."""
+    pass
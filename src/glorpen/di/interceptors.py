@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+'''Built-in service decorators, to be used with :meth:`glorpen.di.container.Service.decorate`.
+
+.. moduleauthor:: Arkadiusz Dzięgiel <arkadiusz.dziegiel@glorpen.pl>
+
+'''
+import time
+import functools
+import threading
+import collections
+
+try:
+    timer = time.monotonic
+except AttributeError:
+    timer = time.time
+
+class LRUCache(object):
+    """Thread-safe LRU cache with optional entries time-to-live (in seconds)."""
+    
+    def __init__(self, maxsize=128, ttl=None):
+        super(LRUCache, self).__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            
+            if expires is not None and expires <= timer():
+                del self._data[key]
+                self.misses += 1
+                return default
+            
+            self._data[key] = self._data.pop(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        expires = None if self.ttl is None else timer() + self.ttl
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires, value)
+            while self.maxsize is not None and len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def info(self):
+        """Returns dict with cache hits, misses and current size."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+_missing = object()
+
+def memoize(f, maxsize=128, ttl=None):
+    """Wraps callable with :class:`.LRUCache`.
+    
+    Calls with unhashable arguments are not cached.
+    Wrapper has `cache` attribute with used :class:`.LRUCache`.
+    """
+    cache = LRUCache(maxsize, ttl)
+    
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        try:
+            key = (args, frozenset(kwargs.items())) if kwargs else args
+            value = cache.get(key, _missing)
+        except TypeError:
+            return f(*args, **kwargs)
+        
+        if value is _missing:
+            value = f(*args, **kwargs)
+            cache.set(key, value)
+        return value
+    
+    wrapper.cache = cache
+    return wrapper
+
+def cache_methods(*methods, **options):
+    """Returns service decorator memoizing results of given instance methods.
+    
+    Methods should be pure - results depend only on given arguments.
+    Each instance gets its own caches.
+    
+    Args:
+        methods: method names
+        maxsize: max count of cached results per method, default is 128
+        ttl: results time-to-live in seconds, by default results do not expire
+    """
+    maxsize = options.pop("maxsize", 128)
+    ttl = options.pop("ttl", None)
+    if options:
+        raise TypeError("Unknown options: %s" % ", ".join(options))
+    
+    def decorator(instance):
+        for name in methods:
+            setattr(instance, name, memoize(getattr(instance, name), maxsize=maxsize, ttl=ttl))
+        return instance
+    
+    return decorator
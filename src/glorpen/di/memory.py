@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+'''Memory footprint of instances held by container scopes.
+
+Size of each instance is computed by walking objects referenced by it (see :func:`gc.get_referents`)
+and summing :func:`sys.getsizeof` of each one. Walking stops at instances of other services,
+classes, modules and functions, so they are not counted as a part of referencing service.
+Objects reachable from many services are counted only once in :attr:`MemoryReport.total_size`.
+
+Sizes are approximate, memory allocated by C extensions outside of Python objects is not visible.
+
+.. moduleauthor:: Arkadiusz Dzięgiel <arkadiusz.dziegiel@glorpen.pl>
+
+'''
+import gc
+import sys
+import types
+
+_skipped_types = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+    types.CodeType, types.FrameType, types.GetSetDescriptorType, types.MemberDescriptorType,
+)
+
+class ServiceMemory(object):
+    """Approximate memory retained by instances of single service, in bytes.
+
+    Args:
+        name: service name used as scope key
+        scope: class of holding scope
+        instances: number of held instances
+        size: memory of objects reachable only from this service
+        shared_size: memory of objects reachable from this and other services
+    """
+    def __init__(self, name, scope):
+        super(ServiceMemory, self).__init__()
+        self.name = name
+        self.scope = scope
+        self.instances = 0
+        self.size = 0
+        self.shared_size = 0
+
+class MemoryReport(object):
+    """Result of :func:`memory_report`.
+
+    Args:
+        services: list of :class:`.ServiceMemory` sorted by size, largest first
+        total_size: memory retained by all held instances, shared objects are counted once
+    """
+    def __init__(self, services, total_size):
+        super(MemoryReport, self).__init__()
+        self.services = services
+        self.total_size = total_size
+
+    def format(self, limit=None):
+        """Returns report formatted as text table."""
+        lines = ["%12s %12s %9s  %s" % ("own KiB", "shared KiB", "instances", "service")]
+        for s in self.services[:limit] if limit else self.services:
+            lines.append("%12.1f %12.1f %9d  %s (%s)" % (
+                s.size / 1024.0, s.shared_size / 1024.0, s.instances, s.name, s.scope.__name__
+            ))
+        lines.append("total: %.1f KiB" % (self.total_size / 1024.0))
+        return "\n".join(lines)
+
+def _walk(instance, boundaries):
+    """Returns dict of id to size of objects reachable from given instance."""
+    sizes = {}
+    pending = [instance]
+    while pending:
+        obj = pending.pop()
+        key = id(obj)
+        if key in sizes or isinstance(obj, _skipped_types):
+            continue
+        sizes[key] = sys.getsizeof(obj, 0)
+        pending.extend(i for i in gc.get_referents(obj) if not id(i) in boundaries)
+    return sizes
+
+def memory_report(container):
+    """Computes memory retained by instances held in scopes of given container.
+
+    Returns:
+        :class:`.MemoryReport`
+    """
+    held = []
+    for scope in container.scopes:
+        for name, instance in scope.held_instances():
+            held.append((name, scope.__class__, instance))
+
+    boundaries = set(id(i[2]) for i in held)
+    boundaries.add(id(container))
+
+    services = {}
+    walked = {}
+    for name, scope_cls, instance in held:
+        key = (name, scope_cls)
+        if not key in services:
+            services[key] = ServiceMemory(name, scope_cls)
+            walked[key] = {}
+        services[key].instances += 1
+        walked[key].update(_walk(instance, boundaries))
+
+    owners = {}
+    for sizes in walked.values():
+        for i in sizes:
+            owners[i] = owners.get(i, 0) + 1
+
+    total_sizes = {}
+    for key, sizes in walked.items():
+        entry = services[key]
+        for i, size in sizes.items():
+            if owners[i] > 1:
+                entry.shared_size += size
+            else:
+                entry.size += size
+        total_sizes.update(sizes)
+
+    report = sorted(services.values(), key=lambda s: (s.size, s.shared_size), reverse=True)
+    return MemoryReport(report, sum(total_sizes.values()))
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+'''Helpers for container parameters.
+
+.. moduleauthor:: Arkadiusz Dzięgiel <arkadiusz.dziegiel@glorpen.pl>
+
+'''
+import os
+
+from glorpen.di import exceptions
+
+_reference_pattern = None
+
+def _get_reference_pattern():
+    # compiled on first use, so importing module does not require :mod:`re`
+    global _reference_pattern
+    if _reference_pattern is None:
+        import re
+        _reference_pattern = re.compile(r"%%|%([^%\s]+)%")
+    return _reference_pattern
+
+class LazyParameter(object):
+    """Marks parameter which value is computed by given callable on first use."""
+    
+    _evaluated = False
+    _value = None
+    
+    def __init__(self, factory):
+        super(LazyParameter, self).__init__()
+        self.factory = factory
+    
+    def get(self):
+        """Returns value computed by factory, factory is called only once."""
+        if not self._evaluated:
+            self._value = self.factory()
+            self._evaluated = True
+        return self._value
+
+class Reference(object):
+    """Marks parameter value as template with `%other.param%` references, see :func:`interpolate`.
+    
+    Values not wrapped by this class are used verbatim.
+    """
+    
+    def __init__(self, template):
+        super(Reference, self).__init__()
+        self.template = template
+    
+    def __repr__(self):
+        return "Reference(%r)" % (self.template,)
+
+def interpolate(value, getter):
+    """Replaces `%other.param%` references in given string.
+    
+    When whole string is a single reference, referenced value is returned as-is (not converted to string).
+    Use `%%` to get literal `%` character.
+    """
+    if not isinstance(value, str) or not "%" in value:
+        return value
+    
+    reference_pattern = _get_reference_pattern()
+    m = reference_pattern.match(value)
+    if m and m.end() == len(value) and m.group(1):
+        return getter(m.group(1))
+    
+    def replace(m):
+        if m.group(1) is None:
+            return "%"
+        return str(getter(m.group(1)))
+    
+    return reference_pattern.sub(replace, value)
+
+def from_environ(prefix, environ=None):
+    """Returns parameters from environment variables starting with *prefix*.
+    
+    Variable name is lowercased after stripping the prefix and double underscores are replaced by dots,
+    so with prefix `APP_` variable `APP_DB__HOST` becomes `db.host` parameter.
+    """
+    if environ is None:
+        environ = os.environ
+    
+    ret = {}
+    for k, v in environ.items():
+        if k.startswith(prefix):
+            ret[k[len(prefix):].lower().replace("__", ".")] = v
+    return ret
+
+def from_file(path):
+    """Returns parameters read from JSON file."""
+    import json
+    
+    with open(path, "rt") as f:
+        data = json.load(f)
+    
+    if not isinstance(data, dict):
+        raise exceptions.ContainerException("Parameters file %r should contain an object" % (path,))
+    
+    return data
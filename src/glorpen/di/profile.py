@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+'''Startup profiler for containers.
+
+Builds container, fetches all (or selected) services and prints time and memory spent on each one::
+
+   python -m glorpen.di.profile myapp.container:build [service ...]
+
+Given target should be a :class:`glorpen.di.container.Container` instance or a callable returning one.
+
+.. moduleauthor:: Arkadiusz Dzięgiel <arkadiusz.dziegiel@glorpen.pl>
+
+'''
+import sys
+import time
+import argparse
+import importlib
+import tracemalloc
+
+from glorpen.di import exceptions
+from glorpen.di.container import Service
+from glorpen.di.tracing import Tracer, Span
+
+try:
+    timer = time.perf_counter
+except AttributeError:
+    timer = time.time
+
+class ServiceProfile(object):
+    """Collected measurements for single service, times are in seconds and memory in bytes."""
+    def __init__(self, name):
+        super(ServiceProfile, self).__init__()
+        self.name = name
+        self.calls = 0
+        self.created = 0
+        self.self_time = 0.0
+        self.cumulative_time = 0.0
+        self.import_time = 0.0
+        self.self_memory = 0
+        self.cumulative_memory = 0
+        self.error = None
+
+class _ProfilingSpan(Span):
+    def __init__(self, tracer, profile):
+        super(_ProfilingSpan, self).__init__()
+        self.tracer = tracer
+        self.profile = profile
+        self.children_time = 0.0
+        self.children_memory = 0
+        self.memory = tracemalloc.get_traced_memory()[0]
+        self.start = timer()
+
+    def set_attribute(self, key, value):
+        if key == "di.cache_hit" and not value:
+            self.profile.created += 1
+
+    def end(self):
+        elapsed = timer() - self.start
+        memory = tracemalloc.get_traced_memory()[0] - self.memory
+
+        self.tracer.stack.pop()
+        if self.tracer.stack:
+            parent = self.tracer.stack[-1]
+            parent.children_time += elapsed
+            parent.children_memory += memory
+
+        self.profile.calls += 1
+        self.profile.cumulative_time += elapsed
+        self.profile.self_time += elapsed - self.children_time
+        self.profile.cumulative_memory += memory
+        self.profile.self_memory += memory - self.children_memory
+
+class ProfilingTracer(Tracer):
+    """Tracer collecting :class:`.ServiceProfile` for each fetched service."""
+    def __init__(self):
+        super(ProfilingTracer, self).__init__()
+        self.profiles = {}
+        self.stack = []
+
+    def get_profile(self, name):
+        if not name in self.profiles:
+            self.profiles[name] = ServiceProfile(name)
+        return self.profiles[name]
+
+    def start_span(self, name, attributes):
+        span = _ProfilingSpan(self, self.get_profile(attributes["di.service"]))
+        self.stack.append(span)
+        return span
+
+def _import_implementation(s_def):
+    """Imports implementation given as import path and returns time spent."""
+    if s_def._impl or s_def._factory or callable(s_def._name_or_impl):
+        return 0.0
+    start = timer()
+    try:
+        s_def._get_implementation()
+    except Exception:
+        # error will be reported when fetching service
+        pass
+    return timer() - start
+
+def profile_container(container, services=None):
+    """Fetches given (or all) services from container and returns list of :class:`.ServiceProfile`."""
+    if services is None:
+        services = [k for k, v in container.services.items() if isinstance(v, Service)]
+
+    tracer = ProfilingTracer()
+    previous_tracer = container.tracer
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    try:
+        for name in services:
+            s_def = container.services.get(name)
+            if isinstance(s_def, Service):
+                tracer.get_profile(name).import_time += _import_implementation(s_def)
+
+        container.tracer = tracer
+        for name in services:
+            try:
+                container.get(name)
+            except exceptions.ContainerException as e:
+                tracer.get_profile(name).error = e
+    finally:
+        container.tracer = previous_tracer
+        if started_tracing:
+            tracemalloc.stop()
+
+    return list(tracer.profiles.values())
+
+sort_keys = {
+    "self": lambda p: p.self_time,
+    "cumulative": lambda p: p.cumulative_time,
+    "import": lambda p: p.import_time,
+    "memory": lambda p: p.self_memory,
+    "name": lambda p: p.name,
+}
+
+def format_report(profiles, sort="cumulative", limit=None):
+    """Returns profiles formatted as text table."""
+    profiles = sorted(profiles, key=sort_keys[sort], reverse=sort != "name")
+    if limit:
+        profiles = profiles[:limit]
+
+    lines = ["%10s %10s %10s %12s %12s %6s  %s" % ("self ms", "cumul ms", "import ms", "self KiB", "cumul KiB", "calls", "service")]
+    for p in profiles:
+        lines.append("%10.3f %10.3f %10.3f %12.1f %12.1f %6d  %s%s" % (
+            p.self_time * 1000, p.cumulative_time * 1000, p.import_time * 1000,
+            p.self_memory / 1024.0, p.cumulative_memory / 1024.0, p.calls,
+            p.name, " (failed: %s)" % p.error if p.error else ""
+        ))
+    return "\n".join(lines)
+
+def load_container(target):
+    """Loads container from `module:attribute` path, attribute can be a container or callable returning one."""
+    module, _, attr = target.partition(":")
+    if not attr:
+        raise ValueError("Target should be given as module:attribute")
+
+    obj = importlib.import_module(module)
+    for part in attr.split("."):
+        obj = getattr(obj, part)
+
+    return obj if hasattr(obj, "services") else obj()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m glorpen.di.profile", description="Profiles creation of container services.")
+    parser.add_argument("target", help="container or callable returning container, as module:attribute")
+    parser.add_argument("services", nargs="*", help="services to fetch, all when not given")
+    parser.add_argument("--sort", choices=sorted(sort_keys.keys()), default="cumulative")
+    parser.add_argument("--limit", type=int, default=None, help="show only top N services")
+    args = parser.parse_args(argv)
+
+    start = timer()
+    container = load_container(args.target)
+    build_time = timer() - start
+
+    profiles = profile_container(container, args.services or None)
+
+    print("container built in %.3f ms" % (build_time * 1000))
+    print(format_report(profiles, args.sort, args.limit))
+
+    return 1 if any(p.error for p in profiles) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,11 +4,28 @@
 .. moduleauthor:: Arkadiusz Dzięgiel <arkadiusz.dziegiel@glorpen.pl>
 
 '''
+import time
+
+from glorpen.di import exceptions
+from glorpen.di._compat import threading, weakref
 
 class ScopeBase(object):
     """Base class for all scopes."""
+    
+    #: Set to `True` when instance returned for given name will not change until :meth:`.invalidate` is called,
+    #: so container can cache it.
+    persistent = False
+    
     def get(self, c, name):
         raise NotImplementedError()
+    
+    def invalidate(self, name):
+        """Drops instance of given service, if scope holds one."""
+        pass
+    
+    def held_instances(self):
+        """Returns list of (service name, instance) tuples currently held by scope."""
+        return []
 
 class ScopePrototype(ScopeBase):
     """Scope that creates new instance of given service each time it is requested."""
@@ -16,13 +33,271 @@ class ScopePrototype(ScopeBase):
         return c()
 
 class ScopeSingleton(ScopeBase):
-    """Scope that creates instance of given service only once."""
+    """Scope that creates instance of given service only once.
+    
+    Instances are created under per-service lock, so concurrent requests get the same instance.
+    Locks are not shared between services, so creating unrelated services does not block each other.
+    """
+    
+    persistent = True
     
     def __init__(self):
         super(ScopeSingleton, self).__init__()
         self.instances = {}
+        self._locks = {}
+    
+    def get(self, creator, name):
+        try:
+            return self.instances[name]
+        except KeyError:
+            pass
+        
+        with self._locks.setdefault(name, threading.RLock()):
+            try:
+                return self.instances[name]
+            except KeyError:
+                instance = self.instances[name] = creator()
+                return instance
+    
+    def invalidate(self, name):
+        self.instances.pop(name, None)
+    
+    def held_instances(self):
+        return list(self.instances.items())
+
+
+class ScopeWeakSingleton(ScopeBase):
+    """Scope that shares instance of given service as long as it is referenced somewhere else.
+    
+    Instances are held by weak references, so after being garbage collected they are created again on next request.
+    Services in this scope should be weak-referenceable.
+    """
+    
+    def __init__(self):
+        super(ScopeWeakSingleton, self).__init__()
+        self.instances = weakref.WeakValueDictionary()
+        self.created = 0
+        self.recreated = 0
+        self._created_names = set()
+        self._locks = {}
     
     def get(self, creator, name):
-        if not name in self.instances:
-            self.instances[name] = creator()
-        return self.instances[name]
+        instance = self.instances.get(name)
+        if instance is not None:
+            return instance
+        
+        with self._locks.setdefault(name, threading.RLock()):
+            instance = self.instances.get(name)
+            if instance is None:
+                instance = creator()
+                try:
+                    self.instances[name] = instance
+                except TypeError:
+                    raise exceptions.ContainerException("Instance of service %r cannot be weakly referenced" % (name,))
+                
+                self.created += 1
+                if name in self._created_names:
+                    self.recreated += 1
+                else:
+                    self._created_names.add(name)
+        
+        return instance
+    
+    def invalidate(self, name):
+        self.instances.pop(name, None)
+    
+    def held_instances(self):
+        return list(self.instances.items())
+    
+    def stats(self):
+        """Returns counts of created instances and of instances created again after being collected."""
+        return {"created": self.created, "recreated": self.recreated, "alive": len(self.instances)}
+
+class _RefreshingEntry(object):
+    __slots__ = ("instance", "expires", "refreshing")
+    
+    def __init__(self, instance, expires):
+        super(_RefreshingEntry, self).__init__()
+        self.instance = instance
+        self.expires = expires
+        self.refreshing = False
+
+def _run_in_thread(function):
+    t = threading.Thread(target=function)
+    t.daemon = True
+    t.start()
+
+class ScopeRefreshing(ScopeBase):
+    """Scope that shares instance of given service for *ttl* seconds and then replaces it in background.
+    
+    First instance is created on request. After it expires, it is still returned while replacement
+    is created by *executor* and swapped in once ready. When creating replacement fails, old instance
+    is kept and next refresh is attempted after *retry_delay* seconds.
+    
+    Args:
+        ttl: seconds after which instance is refreshed
+        retry_delay: seconds to wait before retrying failed refresh
+        executor: callable running given function in background, eg. `ThreadPoolExecutor.submit`,
+                  by default new daemon thread is started
+        clock: callable returning current time in seconds
+    """
+    
+    def __init__(self, ttl=60.0, retry_delay=1.0, executor=None, clock=None):
+        super(ScopeRefreshing, self).__init__()
+        self.ttl = ttl
+        self.retry_delay = retry_delay
+        self.executor = executor or _run_in_thread
+        self.clock = clock or getattr(time, "monotonic", time.time)
+        
+        self.created = 0
+        self.refreshed = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_refresh_time = None
+        self.max_refresh_time = 0.0
+        self.total_refresh_time = 0.0
+        
+        self._entries = {}
+        self._locks = {}
+    
+    def get(self, creator, name):
+        entry = self._entries.get(name)
+        
+        if entry is None:
+            with self._locks.setdefault(name, threading.RLock()):
+                entry = self._entries.get(name)
+                if entry is None:
+                    instance = creator()
+                    entry = self._entries[name] = _RefreshingEntry(instance, self.clock() + self.ttl)
+                    self.created += 1
+                return entry.instance
+        
+        if not entry.refreshing and self.clock() >= entry.expires:
+            with self._locks.setdefault(name, threading.RLock()):
+                if entry.refreshing or self._entries.get(name) is not entry:
+                    return entry.instance
+                entry.refreshing = True
+            try:
+                self.executor(lambda: self._refresh(creator, name, entry))
+            except Exception:
+                entry.refreshing = False
+                raise
+        
+        return entry.instance
+    
+    def _refresh(self, creator, name, entry):
+        start = self.clock()
+        try:
+            instance = creator()
+        except Exception as e:
+            with self._locks[name]:
+                self.failures += 1
+                self.last_error = e
+                entry.expires = self.clock() + self.retry_delay
+                entry.refreshing = False
+            return
+        
+        now = self.clock()
+        with self._locks[name]:
+            # entry could be invalidated while refreshing
+            if self._entries.get(name) is entry:
+                self._entries[name] = _RefreshingEntry(instance, now + self.ttl)
+            
+            elapsed = now - start
+            self.refreshed += 1
+            self.last_refresh_time = elapsed
+            self.total_refresh_time += elapsed
+            self.max_refresh_time = max(self.max_refresh_time, elapsed)
+    
+    def invalidate(self, name):
+        self._entries.pop(name, None)
+    
+    def held_instances(self):
+        return [(name, entry.instance) for name, entry in tuple(self._entries.items())]
+    
+    def stats(self):
+        """Returns counts of created and refreshed instances, failed refreshes and refresh times in seconds."""
+        return {
+            "created": self.created,
+            "refreshed": self.refreshed,
+            "failures": self.failures,
+            "refreshing": sum(1 for i in tuple(self._entries.values()) if i.refreshing),
+            "last_refresh_time": self.last_refresh_time,
+            "max_refresh_time": self.max_refresh_time,
+            "total_refresh_time": self.total_refresh_time,
+        }
+
+class _ThreadStorage(object):
+    __slots__ = ("instances", "__weakref__")
+    
+    def __init__(self):
+        super(_ThreadStorage, self).__init__()
+        self.instances = {}
+
+class ScopeThread(ScopeBase):
+    """Scope that creates instance of given service once per thread.
+    
+    When a thread exits, its instances are passed to *disposer* callable (if given) with service name as first argument.
+    
+    Args:
+        disposer: callable accepting service name and instance
+    """
+    
+    def __init__(self, disposer=None):
+        super(ScopeThread, self).__init__()
+        self.disposer = disposer
+        self._local = threading.local()
+        self._storages = weakref.WeakSet()
+        self._storage_refs = set()
+    
+    def _create_storage(self):
+        storage = self._local.storage = _ThreadStorage()
+        self._storages.add(storage)
+        # storage is dropped by threading.local when thread exits
+        instances = storage.instances
+        if hasattr(weakref, "finalize"):
+            weakref.finalize(storage, self._dispose_instances, instances)
+        else:
+            # Python < 3.4, reference has to be kept alive until callback is called
+            def callback(ref):
+                self._storage_refs.discard(ref)
+                self._dispose_instances(instances)
+            self._storage_refs.add(weakref.ref(storage, callback))
+        return instances
+    
+    def _dispose_instances(self, instances):
+        if self.disposer is None:
+            return
+        for name, instance in tuple(instances.items()):
+            self.disposer(name, instance)
+        instances.clear()
+    
+    def get(self, creator, name):
+        try:
+            instances = self._local.storage.instances
+        except AttributeError:
+            instances = self._create_storage()
+        
+        try:
+            return instances[name]
+        except KeyError:
+            instance = instances[name] = creator()
+            return instance
+    
+    def dispose(self):
+        """Disposes instances created in current thread."""
+        storage = getattr(self._local, "storage", None)
+        if storage is not None:
+            self._dispose_instances(storage.instances)
+            storage.instances.clear()
+    
+    def invalidate(self, name):
+        for storage in tuple(self._storages):
+            storage.instances.pop(name, None)
+    
+    def held_instances(self):
+        """Returns instances held for all alive threads."""
+        ret = []
+        for storage in tuple(self._storages):
+            ret.extend(storage.instances.items())
+        return ret
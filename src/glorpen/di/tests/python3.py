@@ -4,9 +4,57 @@
 .. moduleauthor:: Arkadiusz Dzięgiel <arkadiusz.dziegiel@glorpen.pl>
 
 '''
+import gc
+import sys
+import typing
+import subprocess
 import unittest
+import unittest.mock
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from glorpen.di import Container
+from glorpen.di.scopes import ScopeSingleton, ScopeThread, ScopePrototype
+
+class AutowiredDependency(object): pass
+class AutowiredMissing(object): pass
+class AutowiredPlugin(object): pass
+class AutowiredPluginA(AutowiredPlugin): pass
+class AutowiredPluginBase(AutowiredPlugin): pass
+class AutowiredPluginB(AutowiredPluginBase): pass
+
+class AutowiredService(object):
+    def __init__(self,
+            dependency: "AutowiredDependency",
+            missing: typing.Optional[AutowiredMissing],
+            optional: typing.Optional["AutowiredDependency"],
+            plugins: typing.List[AutowiredPlugin],
+            single: AutowiredPluginBase,
+        ):
+        super(AutowiredService, self).__init__()
+        self.dependency = dependency
+        self.missing = missing
+        self.optional = optional
+        self.plugins = plugins
+        self.single = single
+
+class ProfiledDependency(object):
+    def __init__(self):
+        super(ProfiledDependency, self).__init__()
+        self.data = [object() for _ in range(1000)]
+
+class ProfiledService(object):
+    def __init__(self, dependency):
+        super(ProfiledService, self).__init__()
+
+def build_profiled_container():
+    c = Container()
+    c.add_service(ProfiledDependency)
+    c.add_service(ProfiledService).kwargs(dependency__svc=ProfiledDependency)
+    c.add_service("glorpen.di.tests.python3.ProfiledImported")
+    return c
+
+class ProfiledImported(object): pass
 
 class Test3(unittest.TestCase):
     
@@ -31,3 +79,192 @@ class Test3(unittest.TestCase):
         
         self.assertIsInstance(c.get(MyClass).t, ParamClass)
         self.assertIsInstance(c.get(MyClass).m, ParamClass)
+    
+    def testSignatureHints(self):
+        c = Container()
+        c.add_service(AutowiredService).kwargs_from_signature()
+        c.add_service(AutowiredDependency)
+        c.add_service(AutowiredPluginA)
+        c.add_service(AutowiredPluginB)
+        
+        o = c.get(AutowiredService)
+        self.assertIsInstance(o.dependency, AutowiredDependency, "string annotations are resolved")
+        self.assertIsNone(o.missing, "optional not registered service is None")
+        self.assertIsInstance(o.optional, AutowiredDependency, "optional registered service is injected")
+        self.assertEqual([i.__class__ for i in o.plugins], [AutowiredPluginA, AutowiredPluginB], "all implementations are injected")
+        self.assertIsInstance(o.single, AutowiredPluginB, "implementation is found by base class")
+    
+    def testSignatureHintsKeepDefaults(self):
+        class Settings(object):
+            def __init__(self, timeout: typing.Optional[int] = 30, tags: typing.List[str] = ("x",), missing: typing.Optional[AutowiredMissing] = None):
+                super(Settings, self).__init__()
+                self.timeout = timeout
+                self.tags = tags
+                self.missing = missing
+        
+        c = Container()
+        c.add_service(Settings).kwargs_from_signature()
+        
+        o = c.get(Settings)
+        self.assertEqual(o.timeout, 30, "default is used for optional not registered service")
+        self.assertEqual(o.tags, ("x",), "default is used when there are no implementations")
+        self.assertIsNone(o.missing)
+    
+    def testBindingChangedAfterFetching(self):
+        class Base(object): pass
+        class ImplA(Base): pass
+        class ImplB(Base): pass
+        class User(object):
+            def __init__(self, dep: Base):
+                super(User, self).__init__()
+                self.dep = dep
+        
+        c = Container()
+        c.add_service(ImplA)
+        c.add_service(User).kwargs_from_signature().scope(ScopePrototype)
+        svc = c.add_service("b")
+        self.assertIsInstance(c.get(User).dep, ImplA)
+        
+        svc.implementation(ImplB).primary()
+        self.assertIsInstance(c.get(User).dep, ImplB, "autowired arguments follow changed binding")
+    
+    def testBindingsChangedWhileFetching(self):
+        class Base(object): pass
+        class Impl(Base): pass
+        
+        c = Container()
+        c.add_service(Impl).scope(ScopePrototype)
+        errors = []
+        done = threading.Event()
+        def reader():
+            while not done.is_set():
+                try:
+                    c.get(Base)
+                except Exception as e:
+                    errors.append(e)
+        
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        t = threading.Thread(target=reader)
+        t.start()
+        try:
+            for _ in range(1000):
+                c.override_service(Impl)
+        finally:
+            done.set()
+            t.join()
+            sys.setswitchinterval(interval)
+        
+        self.assertEqual(errors, [], "readers always see complete definitions snapshot")
+    
+    def testSignatureArgumentsOfPrototypeFactory(self):
+        class Product(object): pass
+        class ProtoFactory(object):
+            def create(self):
+                return Product()
+        
+        c = Container()
+        c.add_service(ProtoFactory).scope(ScopePrototype)
+        c.add_service(Product).factory(service=ProtoFactory, method="create").kwargs_from_signature().scope(ScopePrototype)
+        
+        for _ in range(20):
+            self.assertIsInstance(c.get(Product), Product)
+        
+        plan = c._get_plan(c.get_definition(Product))
+        self.assertEqual(len(plan.signature_arguments), 1, "arguments are cached once per factory function")
+    
+    def testSignatureHintsAreCached(self):
+        from glorpen.di import autowiring
+        self.assertIs(autowiring.get_requirements(AutowiredService.__init__), autowiring.get_requirements(AutowiredService.__init__))
+    
+    def testProfiler(self):
+        from glorpen.di import profile
+        
+        c = profile.load_container("glorpen.di.tests.python3:build_profiled_container")
+        profiles = dict((p.name, p) for p in profile.profile_container(c))
+        
+        dependency = profiles["glorpen.di.tests.python3.ProfiledDependency"]
+        service = profiles["glorpen.di.tests.python3.ProfiledService"]
+        
+        self.assertEqual(dependency.created, 1)
+        self.assertEqual(dependency.calls, 2, "fetched as dependency and directly")
+        self.assertGreater(service.cumulative_time, service.self_time)
+        self.assertGreater(dependency.self_memory, 1000 * 16, "memory of created objects is measured")
+        self.assertLess(service.self_memory, dependency.self_memory, "dependency memory is not counted as self memory")
+        self.assertIn("ProfiledImported", profile.format_report(profiles.values()))
+        self.assertIsNone(c.tracer, "tracer is restored")
+    
+    def testThreadScope(self):
+        class Client(object):
+            def __init__(self):
+                super(Client, self).__init__()
+                self.thread = threading.current_thread().ident
+        
+        disposed = []
+        c = Container()
+        c.set_scope_hierarchy(ScopeSingleton, ScopeThread(disposer=lambda name, o: disposed.append(o)), ScopePrototype)
+        c.add_service(Client).scope(ScopeThread)
+        
+        def worker(_):
+            o = c.get(Client)
+            self.assertIs(o, c.get(Client), "instance is shared in thread")
+            self.assertEqual(o.thread, threading.current_thread().ident, "instance is created in current thread")
+            return o
+        
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            instances = list(pool.map(worker, range(30)))
+        
+        unique = set(id(i) for i in instances)
+        self.assertEqual(len(unique), len(set(i.thread for i in instances)), "one instance per thread")
+        del instances
+        
+        gc.collect()
+        self.assertEqual(len(disposed), len(unique), "instances are disposed when thread exits")
+    
+    def testDefinitionsAreNotModifiedByCreation(self):
+        class Dependency(object): pass
+        class MyClass(object):
+            def __init__(self, a, b, dependency, modified=None):
+                super(MyClass, self).__init__()
+                self.modified = modified
+        
+        def modifier(kwargs):
+            kwargs["modified"] = threading.current_thread().ident
+        
+        c = Container()
+        c.add_service(Dependency).scope(ScopePrototype)
+        svc = c.add_service(MyClass)\
+            .factory(callable=MyClass, a="a")\
+            .kwargs(b="b", dependency__svc=Dependency)\
+            .kwargs_modifier(callable=modifier)\
+            .scope(ScopePrototype)
+        
+        factory_kwargs = dict(svc._factory[1])
+        kwargs = dict(svc._kwargs)
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            instances = list(pool.map(lambda _: c.get(MyClass), range(500)))
+        
+        self.assertEqual(svc._factory[1], factory_kwargs, "factory kwargs are not modified")
+        self.assertEqual(svc._kwargs, kwargs, "constructor kwargs are not modified")
+        self.assertTrue(all(i.modified for i in instances))
+    
+    def testCallsOnMocks(self):
+        class Conn(object):
+            def connect(self):
+                raise AssertionError("real connect called")
+        
+        mock = unittest.mock.Mock(spec=Conn)
+        c = Container()
+        c.add_service(Conn).factory(callable=lambda: mock).call("connect")
+        
+        self.assertIs(c.get(Conn), mock)
+        mock.connect.assert_called_once_with()
+    
+    def testImportedModules(self):
+        code = "import sys, glorpen.di; print(','.join(sys.modules))"
+        out = subprocess.check_output([sys.executable, "-c", code], env={"PYTHONPATH": ":".join(sys.path)})
+        modules = out.decode().strip().split(",")
+        
+        for name in ("six", "inspect", "json", "threading", "glorpen.di.autowiring"):
+            self.assertNotIn(name, modules, "%s is not imported with glorpen.di" % name)
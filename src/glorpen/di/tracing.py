@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+'''Tracing of service creation.
+
+Set :attr:`glorpen.di.container.Container.tracer` to enable tracing, by default it is disabled.
+
+.. moduleauthor:: Arkadiusz Dzięgiel <arkadiusz.dziegiel@glorpen.pl>
+
+'''
+
+class Span(object):
+    """Span returned by :meth:`.Tracer.start_span`, does nothing by default."""
+    
+    def set_attribute(self, key, value):
+        pass
+    
+    def record_exception(self, exception):
+        pass
+    
+    def end(self):
+        pass
+
+class Tracer(object):
+    """Minimal tracer interface used by :class:`glorpen.di.container.Container`.
+    
+    Spans are started and ended in nested order,
+    each one covers fetching single service (including creation of its dependencies).
+    
+    Reported attributes are:
+    
+    - `di.service` - service name
+    - `di.scope` - scope class name
+    - `di.factory` - if service is created by factory
+    - `di.cache_hit` - if instance was returned by scope without creating it
+    - `di.failed` - if creation failed
+    """
+    
+    def start_span(self, name, attributes):
+        """Returns started :class:`.Span`."""
+        return Span()
+
+class _OpenTelemetrySpan(Span):
+    def __init__(self, span, activation):
+        super(_OpenTelemetrySpan, self).__init__()
+        self.span = span
+        self.activation = activation
+        activation.__enter__()
+    
+    def set_attribute(self, key, value):
+        self.span.set_attribute(key, value)
+    
+    def record_exception(self, exception):
+        self.span.record_exception(exception)
+    
+    def end(self):
+        self.activation.__exit__(None, None, None)
+        self.span.end()
+
+class OpenTelemetryTracer(Tracer):
+    """Adapter for OpenTelemetry tracer.
+    
+    :mod:`opentelemetry` is imported only when this class is instantiated.
+    
+    Args:
+        tracer: OpenTelemetry tracer, when not given it is fetched from global tracer provider
+    """
+    def __init__(self, tracer=None):
+        super(OpenTelemetryTracer, self).__init__()
+        from opentelemetry import trace
+        
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("glorpen.di")
+    
+    def start_span(self, name, attributes):
+        span = self.tracer.start_span(name, attributes=attributes)
+        return _OpenTelemetrySpan(span, self._trace.use_span(span, end_on_exit=False))